@@ -1,15 +1,23 @@
 import sys
 import os
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QListWidget, QListWidgetItem,
-    QFileDialog, QLineEdit, QComboBox, QSlider, QDialog, QCheckBox, QColorDialog, QInputDialog, QMessageBox
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QListView,
+    QFileDialog, QLineEdit, QComboBox, QSlider, QSpinBox, QDialog, QCheckBox, QColorDialog, QInputDialog, QMessageBox
 )
-from PyQt5.QtGui import QPixmap, QImage, QIcon, QColor, QMouseEvent
+from PyQt5.QtGui import QPixmap, QColor, QMouseEvent
 from PyQt5.QtCore import Qt, QSize, QPoint
-from PIL import Image, ImageDraw, ImageFont
 from Picture_import import PhotoWatermarkApp
 from Picture_export import show_export_dialog
 from template_manager import TemplateManager, create_template_data_from_app, apply_template_to_app
+from image_cache import ImageCache
+from folder_scanner import is_supported_image
+from thumbnail_loader import pil_to_shared_qimage
+from image_list_model import ImageListModel
+from preview_scheduler import PreviewScheduler
+from watermark_renderer import (
+    render_preview_frame, fit_preview, load_watermark_image,
+    TILE_SPACING, TILE_STAGGER
+)
 
 class WatermarkApp(QWidget):
     def __init__(self):
@@ -22,6 +30,13 @@ class WatermarkApp(QWidget):
         self.text_color = QColor(255, 255, 255)  # 默认白色
         self.scale_factor = 1.0  # 缩放因子
         self.template_manager = TemplateManager()  # 模板管理器
+        self.image_cache = ImageCache()  # 解码图片缓存（预览使用）
+        self.proxy_preview = True  # 预览在代理图上合成
+        self.preview_ratio = 1.0  # 代理图与原图的尺寸比例
+        self.list_model = ImageListModel(self)  # 图片列表模型（缩略图与导入窗口共享磁盘缓存）
+        # 预览调度器：合并连续的变化事件，在后台线程渲染
+        self.preview_scheduler = PreviewScheduler(
+            self.get_preview_snapshot, self.render_preview, self.show_preview_frame, parent=self)
         self.init_ui()
         self.load_last_settings()  # 加载上次设置
         
@@ -45,11 +60,12 @@ class WatermarkApp(QWidget):
         
         # 左侧图片列表
         left_layout = QVBoxLayout()
-        self.list_widget = QListWidget()
-        self.list_widget.setIconSize(QSize(80, 80))
-        self.list_widget.itemClicked.connect(self.on_image_selected)
+        self.list_view = QListView()
+        self.list_view.setIconSize(QSize(80, 80))
+        self.list_model.attach(self.list_view)
+        self.list_view.clicked.connect(self.on_image_selected)
         left_layout.addWidget(QLabel('图片列表'))
-        left_layout.addWidget(self.list_widget)
+        left_layout.addWidget(self.list_view)
         self.import_btn = QPushButton('导入图片')
         self.import_btn.clicked.connect(self.import_images)
         left_layout.addWidget(self.import_btn)
@@ -204,6 +220,27 @@ class WatermarkApp(QWidget):
         grid_layout.addWidget(self.grid_combo)
         right_layout.addLayout(grid_layout)
 
+        # 平铺水印（斜向重复覆盖整幅图片）
+        tile_layout = QHBoxLayout()
+        self.tile_check = QCheckBox('平铺水印')
+        self.tile_check.stateChanged.connect(self.update_preview)
+        tile_layout.addWidget(self.tile_check)
+        self.tile_spacing_spin = QSpinBox()
+        self.tile_spacing_spin.setRange(0, 5000)
+        self.tile_spacing_spin.setSuffix(' px')
+        self.tile_spacing_spin.setValue(TILE_SPACING)
+        self.tile_spacing_spin.valueChanged.connect(self.update_preview)
+        tile_layout.addWidget(QLabel('间距:'))
+        tile_layout.addWidget(self.tile_spacing_spin)
+        self.tile_stagger_spin = QSpinBox()
+        self.tile_stagger_spin.setRange(0, 100)
+        self.tile_stagger_spin.setSuffix('%')
+        self.tile_stagger_spin.setValue(TILE_STAGGER)
+        self.tile_stagger_spin.valueChanged.connect(self.update_preview)
+        tile_layout.addWidget(QLabel('隔行错开:'))
+        tile_layout.addWidget(self.tile_stagger_spin)
+        right_layout.addLayout(tile_layout)
+
         # 旋转
         rotate_layout = QHBoxLayout()
         self.rotate_slider = QSlider(Qt.Horizontal)
@@ -290,7 +327,7 @@ class WatermarkApp(QWidget):
             self.image_path_label.setText(os.path.basename(file_path))
             try:
                 # 加载水印图片
-                self.watermark_image = Image.open(file_path).convert('RGBA')
+                self.watermark_image = load_watermark_image(file_path)
                 self.update_preview()
             except Exception as e:
                 self.image_path_label.setText('加载失败')
@@ -417,6 +454,8 @@ class WatermarkApp(QWidget):
         """程序关闭事件 - 保存当前设置"""
         template_data = create_template_data_from_app(self)
         self.template_manager.save_current_settings(template_data)
+        self.preview_scheduler.cancel()
+        self.preview_scheduler.wait_for_done()
         event.accept()
 
     def import_images(self):
@@ -429,56 +468,24 @@ class WatermarkApp(QWidget):
         
         if result == QDialog.Accepted and hasattr(self.pp_window, 'image_list'):
             self.image_list = self.pp_window.image_list.copy()
-            self.list_widget.clear()
-            for f in self.image_list:
-                item = QListWidgetItem(os.path.basename(f))
-                icon = QIcon(QPixmap(f).scaled(80, 80, Qt.KeepAspectRatio))
-                item.setIcon(icon)
-                self.list_widget.addItem(item)
+            # 导入窗口已生成的缩略图会直接命中磁盘缓存
+            self.list_model.set_paths(self.image_list)
             if self.image_list:
                 self.current_image_path = self.image_list[0]
                 self.drag_position = QPoint(100, 100)  # 重置拖拽位置
                 self.update_preview()
 
     def is_supported_image(self, path):
-        ext = os.path.splitext(path)[1].lower()
-        return ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
+        return is_supported_image(path)
 
-    def on_image_selected(self, item):
-        idx = self.list_widget.row(item)
+    def on_image_selected(self, index):
+        idx = index.row()
         self.current_image_path = self.image_list[idx]
         self.drag_position = QPoint(100, 100)  # 重置拖拽位置
         self.update_preview()
 
     # 移除颜色选择功能
 
-    def get_grid_position(self, img_size, wm_size):
-        """获取九宫格位置"""
-        w, h = img_size
-        ww, wh = wm_size
-        pos_map = {
-            0: (0, 0),  # 左上
-            1: ((w - ww)//2, 0),  # 上中
-            2: (w - ww, 0),  # 右上
-            3: (0, (h - wh)//2),  # 左中
-            4: ((w - ww)//2, (h - wh)//2),  # 中心
-            5: (w - ww, (h - wh)//2),  # 右中
-            6: (0, h - wh),  # 左下
-            7: ((w - ww)//2, h - wh),  # 下中
-            8: (w - ww, h - wh),  # 右下
-        }
-        idx = self.grid_combo.currentIndex()
-        return pos_map.get(idx, (0, 0))
-
-    def get_drag_position(self, img_size, wm_size):
-        """获取拖拽位置"""
-        w, h = img_size
-        ww, wh = wm_size
-        # 确保水印在图片范围内
-        x = max(0, min(self.drag_position.x(), w - ww))
-        y = max(0, min(self.drag_position.y(), h - wh))
-        return (x, y)
-
     # 鼠标事件处理 - 拖拽和缩放功能
     def preview_mouse_press(self, event: QMouseEvent):
         if event.button() == Qt.LeftButton:
@@ -490,9 +497,9 @@ class WatermarkApp(QWidget):
 
     def preview_mouse_move(self, event: QMouseEvent):
         if hasattr(self, 'dragging') and self.dragging:
-            # 更新拖拽位置
+            # 更新拖拽位置（预览区的位移换算到原图坐标）
             delta = event.pos() - self.drag_start
-            self.drag_position += delta
+            self.drag_position += delta / self.preview_ratio
             self.drag_start = event.pos()
             self.update_preview()
         elif hasattr(self, 'scaling') and self.scaling:
@@ -522,339 +529,83 @@ class WatermarkApp(QWidget):
     def update_scale_label(self, value):
         self.scale_label.setText(f"{value}%")
 
-    def get_font_style(self):
-        """获取字体样式设置"""
-        # 优先使用控件的当前值，确保实时更新
-        font_name = self.font_combo.currentText()
-        font_size = int(self.font_size_spin.currentText())
-        
-        # 构建字体样式字符串
-        style = ""
-        bold = self.bold_check.isChecked()
-        italic = self.italic_check.isChecked()
-        
-        if bold:
-            style += "bold "
-        if italic:
-            style += "italic "
-        
-        return font_name, font_size, style.strip()
-
-    def apply_text_effects(self, draw, text, position, font, color):
-        """应用文本效果（阴影、描边和斜体）"""
-        if self.shadow_check.isChecked():
-            # 添加阴影效果
-            shadow_color = (0, 0, 0, color[3])  # 黑色阴影
-            shadow_offset = 2
-            draw.text((position[0] + shadow_offset, position[1] + shadow_offset), 
-                     text, font=font, fill=shadow_color)
-        
-        if self.stroke_check.isChecked():
-            # 添加描边效果
-            stroke_color = (0, 0, 0, color[3])  # 黑色描边
-            stroke_width = 2
-            for dx in range(-stroke_width, stroke_width + 1):
-                for dy in range(-stroke_width, stroke_width + 1):
-                    if dx != 0 or dy != 0:
-                        draw.text((position[0] + dx, position[1] + dy), 
-                                 text, font=font, fill=stroke_color)
-        
-        # 绘制主文本
-        if self.italic_check.isChecked():
-            # 使用简单的斜体模拟 - 在多个位置绘制文本创建倾斜效果
-            base_x, base_y = position
-            # 绘制多个轻微偏移的文本来模拟斜体
-            for offset in range(3):
-                # 每个偏移位置的透明度逐渐降低
-                alpha_factor = 1.0 - (offset * 0.2)
-                italic_alpha = int(color[3] * alpha_factor)
-                italic_color = (color[0], color[1], color[2], italic_alpha)
-                draw.text((base_x + offset, base_y), text, font=font, fill=italic_color)
-        else:
-            # 正常绘制文本
-            draw.text(position, text, font=font, fill=color)
+    def get_watermark_settings(self):
+        """获取当前水印设置的快照（可序列化，供渲染核心和批量导出使用）"""
+        settings = create_template_data_from_app(self)
+        if self.watermark_image is None:
+            # 水印图片未成功加载时，不让渲染核心按路径重新加载
+            settings["image_path"] = ""
+        return settings
 
     def update_preview(self):
+        """请求刷新预览（由调度器合并连续的变化事件并在后台渲染）"""
         if not self.current_image_path:
+            self.preview_scheduler.cancel()
             self.preview_label.clear()
             self.preview_label.setText('请先导入图片')
             return
-            
-        img = Image.open(self.current_image_path).convert('RGBA')
-        preview = img.copy()
-        
-        if self.watermark_type == 'text':
-            # 文本水印处理
-            text = self.text_edit.text().strip()
-            if not text:
-                text = "watermark"
-                
-            # 使用用户设置的字体、颜色和透明度
-            font_name, font_size, font_style = self.get_font_style()
-            opacity = self.opacity_slider.value() / 100.0  # 透明度百分比转小数
-            color = (self.text_color.red(), self.text_color.green(), self.text_color.blue(), int(255 * opacity))
-            scale_factor = self.scale_slider.value() / 100.0  # 缩放因子
-            
-            # 尝试加载用户选择的字体（应用缩放，使用更高质量）
-            scaled_font_size = max(10, int(font_size * scale_factor))
-            
-            # 字体名称映射，将常见的中文字体名称映射到系统字体文件
-            font_mapping = {
-                "SimHei": "simhei.ttf",  # 黑体
-                "Microsoft YaHei": "msyh.ttc",  # 微软雅黑
-                "SimSun": "simsun.ttc",  # 宋体
-                "Arial": "arial.ttf",
-                "Times New Roman": "times.ttf"
-            }
-            
-            # 获取对应的字体文件名
-            font_file = font_mapping.get(font_name, font_name)
-            
-            try:
-                # 首先尝试直接加载字体文件
-                font = ImageFont.truetype(font_file, scaled_font_size, encoding="unic")
-                
-                # 应用粗体和斜体效果
-                if self.bold_check.isChecked() and self.italic_check.isChecked():
-                    # 粗体+斜体 - 尝试加载粗斜体版本
-                    try:
-                        font = ImageFont.truetype(font_file, scaled_font_size, encoding="unic", index=3)
-                    except:
-                        # 如果失败，使用更大的字号模拟粗体效果
-                        font = ImageFont.truetype(font_file, int(scaled_font_size * 1.2), encoding="unic")
-                elif self.bold_check.isChecked():
-                    # 仅粗体 - 尝试加载粗体版本
-                    try:
-                        font = ImageFont.truetype(font_file, scaled_font_size, encoding="unic", index=1)
-                    except:
-                        # 如果失败，使用更大的字号模拟粗体效果
-                        font = ImageFont.truetype(font_file, int(scaled_font_size * 1.1), encoding="unic")
-                elif self.italic_check.isChecked():
-                    # 仅斜体 - 使用倾斜变换来模拟斜体效果
-                    font = ImageFont.truetype(font_file, scaled_font_size, encoding="unic")
-                    # 斜体效果将在后续的文本绘制中处理
-                    
-            except Exception as e:
-                # 如果加载失败，尝试使用系统默认字体
-                try:
-                    font = ImageFont.truetype("arial.ttf", scaled_font_size, encoding="unic")
-                except:
-                    # 如果都失败，使用默认字体但设置更大的尺寸
-                    font = ImageFont.load_default()
-                    # 对于默认字体，我们需要使用更大的尺寸
-                    scaled_font_size = max(10, int(font_size * scale_factor * 3))  # 默认字体三倍大小
-                
-            # 计算文本尺寸
-            temp_img = Image.new('RGBA', (1, 1), (255, 255, 255, 0))
-            temp_draw = ImageDraw.Draw(temp_img)
-            bbox = temp_draw.textbbox((0, 0), text, font=font)
-            w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-            
-            # 获取位置
-            if hasattr(self, 'dragging') and self.dragging:
-                pos = self.get_drag_position(preview.size, (w, h))
-            else:
-                pos = self.get_grid_position(preview.size, (w, h))
-                self.drag_position = QPoint(pos[0], pos[1])
-            
-            # 旋转
-            angle = self.rotate_slider.value()
-            
-            # 创建水印图层
-            txt_img = Image.new('RGBA', (w, h), (255, 255, 255, 0))
-            draw = ImageDraw.Draw(txt_img)
-            
-            # 绘制文本到水印图层
-            self.apply_text_effects(draw, text, (-bbox[0], -bbox[1]), font, color)
-            
-            # 应用旋转
-            if angle != 0:
-                txt_img = txt_img.rotate(angle, expand=1, center=(w//2, h//2))
-                w, h = txt_img.size
-                if hasattr(self, 'dragging') and self.dragging:
-                    pos = self.get_drag_position(preview.size, (w, h))
-                else:
-                    pos = self.get_grid_position(preview.size, (w, h))
-            
-            # 应用额外的图像缩放
-            if scale_factor > 1.0:
-                additional_scale = min(3.0, scale_factor)
-                new_width = int(w * additional_scale)
-                new_height = int(h * additional_scale)
-                txt_img = txt_img.resize((new_width, new_height), Image.LANCZOS)
-                w, h = new_width, new_height
-                if hasattr(self, 'dragging') and self.dragging:
-                    pos = self.get_drag_position(preview.size, (w, h))
-                else:
-                    pos = self.get_grid_position(preview.size, (w, h))
-            
-            # 将水印放置到正确位置
-            final_img = Image.new('RGBA', preview.size, (255, 255, 255, 0))
-            final_img.paste(txt_img, pos, txt_img)
-            preview = Image.alpha_composite(preview, final_img)
-            
-        elif self.watermark_type == 'image' and self.watermark_image:
-            # 图片水印处理
-            watermark_img = self.watermark_image.copy()
-            
-            # 应用图片透明度
-            image_opacity = self.image_opacity_slider.value() / 100.0
-            if image_opacity < 1.0:
-                # 创建透明水印
-                alpha = watermark_img.split()[3]
-                alpha = alpha.point(lambda p: p * image_opacity)
-                watermark_img.putalpha(alpha)
-            
-            # 应用图片缩放
-            image_scale = self.image_scale_slider.value() / 100.0
-            if image_scale != 1.0:
-                new_width = int(watermark_img.width * image_scale)
-                new_height = int(watermark_img.height * image_scale)
-                watermark_img = watermark_img.resize((new_width, new_height), Image.LANCZOS)
-            
-            w, h = watermark_img.size
-            
-            # 获取位置
-            if hasattr(self, 'dragging') and self.dragging:
-                pos = self.get_drag_position(preview.size, (w, h))
-            else:
-                pos = self.get_grid_position(preview.size, (w, h))
-                self.drag_position = QPoint(pos[0], pos[1])
-            
-            # 应用旋转
-            angle = self.rotate_slider.value()
-            if angle != 0:
-                watermark_img = watermark_img.rotate(angle, expand=1, center=(w//2, h//2))
-                w, h = watermark_img.size
-                if hasattr(self, 'dragging') and self.dragging:
-                    pos = self.get_drag_position(preview.size, (w, h))
-                else:
-                    pos = self.get_grid_position(preview.size, (w, h))
-            
-            # 将图片水印放置到正确位置
-            final_img = Image.new('RGBA', preview.size, (255, 255, 255, 0))
-            final_img.paste(watermark_img, pos, watermark_img)
-            preview = Image.alpha_composite(preview, final_img)
-        
-        # 显示预览
-        qimg = QImage(preview.tobytes(), preview.size[0], preview.size[1], QImage.Format_RGBA8888)
-        pixmap = QPixmap.fromImage(qimg)
-        self.preview_label.setPixmap(pixmap.scaled(self.preview_label.size(), Qt.KeepAspectRatio))
-
-    def apply_watermark_to_image(self, image_path):
-        """为单张图片添加水印"""
-        img = Image.open(image_path).convert('RGBA')
-        
-        if self.watermark_type == 'text':
-            # 文本水印处理
-            text = self.text_edit.text().strip()
-            if not text:
-                text = "watermark"
-                
-            # 使用用户设置的字体、颜色和透明度
-            font_name, font_size, font_style = self.get_font_style()
-            opacity = self.opacity_slider.value() / 100.0  # 透明度百分比转小数
-            color = (self.text_color.red(), self.text_color.green(), self.text_color.blue(), int(255 * opacity))
-            scale_factor = self.scale_slider.value() / 100.0  # 缩放因子
-            
-            try:
-                # 尝试加载用户选择的字体（应用缩放，使用更高质量）
-                scaled_font_size = max(10, int(font_size * scale_factor))
-                # 使用更高质量的字体加载方式
-                font = ImageFont.truetype(font_name, scaled_font_size, encoding="unic")
-            except:
-                # 如果失败，尝试使用其他字体
-                try:
-                    # 尝试使用Arial字体
-                    font = ImageFont.truetype("arial.ttf", scaled_font_size, encoding="unic")
-                except:
-                    # 如果都失败，使用默认字体但设置更大的尺寸
-                    font = ImageFont.load_default()
-                    # 对于默认字体，我们需要使用更大的尺寸
-                    scaled_font_size = max(10, int(font_size * scale_factor * 3))  # 默认字体三倍大小
-                
-            # 计算文本尺寸
-            temp_img = Image.new('RGBA', (1, 1), (255, 255, 255, 0))
-            temp_draw = ImageDraw.Draw(temp_img)
-            bbox = temp_draw.textbbox((0, 0), text, font=font)
-            w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-            
-            # 获取位置（使用当前拖拽位置）
-            pos = self.get_drag_position(img.size, (w, h))
-            
-            # 旋转
-            angle = self.rotate_slider.value()
-            
-            # 创建水印图层（包含文本的完整尺寸）
-            txt_img = Image.new('RGBA', (w, h), (255, 255, 255, 0))
-            draw = ImageDraw.Draw(txt_img)
-            
-            # 绘制文本到水印图层（考虑基线偏移，并应用效果）
-            self.apply_text_effects(draw, text, (-bbox[0], -bbox[1]), font, color)
-            
-            # 应用旋转（围绕水印自身中心）
-            if angle != 0:
-                txt_img = txt_img.rotate(angle, expand=1, center=(w//2, h//2))
-                # 旋转后水印尺寸可能变化，需要重新计算位置
-                w, h = txt_img.size
-                pos = self.get_drag_position(img.size, (w, h))
-            
-            # 应用额外的图像缩放来获得更大的水印
-            if scale_factor > 1.0:
-                # 如果缩放因子大于1，使用图像缩放来进一步放大
-                additional_scale = min(3.0, scale_factor)  # 最大额外缩放3倍
-                new_width = int(w * additional_scale)
-                new_height = int(h * additional_scale)
-                txt_img = txt_img.resize((new_width, new_height), Image.LANCZOS)
-                w, h = new_width, new_height
-                # 重新计算位置
-                pos = self.get_drag_position(img.size, (w, h))
-            
-            # 将旋转后的水印放置到正确位置
-            final_img = Image.new('RGBA', img.size, (255, 255, 255, 0))
-            final_img.paste(txt_img, pos, txt_img)
-            txt_img = final_img
-            
-            # 合成图片
-            img = Image.alpha_composite(img, txt_img)
-            
-        elif self.watermark_type == 'image' and self.watermark_image:
-            # 图片水印处理
-            watermark_img = self.watermark_image.copy()
-            
-            # 应用图片透明度
-            image_opacity = self.image_opacity_slider.value() / 100.0
-            if image_opacity < 1.0:
-                # 创建透明水印
-                alpha = watermark_img.split()[3]
-                alpha = alpha.point(lambda p: p * image_opacity)
-                watermark_img.putalpha(alpha)
-            
-            # 应用图片缩放
-            image_scale = self.image_scale_slider.value() / 100.0
-            if image_scale != 1.0:
-                new_width = int(watermark_img.width * image_scale)
-                new_height = int(watermark_img.height * image_scale)
-                watermark_img = watermark_img.resize((new_width, new_height), Image.LANCZOS)
-            
-            w, h = watermark_img.size
-            
-            # 获取位置
-            pos = self.get_drag_position(img.size, (w, h))
-            
-            # 应用旋转
-            angle = self.rotate_slider.value()
-            if angle != 0:
-                watermark_img = watermark_img.rotate(angle, expand=1, center=(w//2, h//2))
-                w, h = watermark_img.size
-                pos = self.get_drag_position(img.size, (w, h))
-            
-            # 将图片水印放置到正确位置
-            final_img = Image.new('RGBA', img.size, (255, 255, 255, 0))
-            final_img.paste(watermark_img, pos, watermark_img)
-            img = Image.alpha_composite(img, final_img)
+        self.preview_scheduler.schedule()
+
+    def refresh_watermark_image(self):
+        """水印图片文件被修改时重新加载（按路径和修改时间判断，未变化时直接复用）"""
+        if self.watermark_image is None or not getattr(self, 'watermark_image_path', ''):
+            return
+        try:
+            self.watermark_image = load_watermark_image(self.watermark_image_path)
+        except (OSError, ValueError):
+            pass  # 文件暂时不可读时继续使用已加载的图片
+
+    def get_preview_snapshot(self):
+        """在界面线程中收集渲染预览所需的全部状态"""
+        self.refresh_watermark_image()
+        label_size = self.preview_label.size()
+        return {
+            "image_path": self.current_image_path,
+            "settings": self.get_watermark_settings(),
+            "watermark_image": self.watermark_image,
+            "label_size": (label_size.width(), label_size.height()),
+            "proxy": self.proxy_preview,
+            "dragging": hasattr(self, 'dragging') and self.dragging
+        }
+
+    def render_preview(self, snapshot):
+        """渲染预览帧（在后台线程执行，不访问界面控件）
+
+        返回 (QImage, 代理图比例, 原图坐标系中的水印位置)。
+        """
+        # 从缓存获取解码后的图片（只读，合成时会生成新图片）
+        if snapshot["proxy"]:
+            # 在与预览区大小相当的代理图上合成，水印参数按比例缩放
+            preview, full_size = self.image_cache.get_proxy(snapshot["image_path"], snapshot["label_size"])
+        else:
+            preview = self.image_cache.get(snapshot["image_path"])
+            full_size = preview.size
         
-        return img
+        # 渲染水印图层并合成到预览图
+        preview, full_pos = render_preview_frame(
+            preview, full_size, snapshot["settings"], snapshot["watermark_image"], snapshot["dragging"])
+        # 全分辨率预览先在后台线程缩小到预览区大小，界面线程只转换和显示小图
+        preview = fit_preview(preview, snapshot["label_size"])
+        ratio = preview.width / full_size[0]
+        
+        return pil_to_shared_qimage(preview), ratio, (full_pos if not snapshot["dragging"] else None)
+
+    def show_preview_frame(self, result, error):
+        """在界面线程中显示渲染完成的预览帧"""
+        if error is not None:
+            self.preview_label.clear()
+            self.preview_label.setText(f'预览失败: {error}')
+            return
+        qimg, ratio, grid_pos = result
+        self.preview_ratio = ratio
+        if grid_pos is not None:
+            # 非拖拽状态下同步九宫格位置，导出时使用
+            self.drag_position = QPoint(grid_pos[0], grid_pos[1])
+        # 预览帧不大于预览区，直接显示，不再缩放
+        self.preview_label.setPixmap(QPixmap.fromImage(qimg))
+        self.preview_label.setToolTip(
+            f"预览耗时: {self.preview_scheduler.frame_time_ms:.1f} ms "
+            f"(平均 {self.preview_scheduler.average_frame_time_ms:.1f} ms)")
 
     def export_image(self):
         if not self.image_list:
@@ -862,14 +613,14 @@ class WatermarkApp(QWidget):
             QMessageBox.warning(self, '警告', '请先导入图片！')
             return
         
-        # 为所有图片添加水印
-        watermarked_images = []
-        for image_path in self.image_list:
-            watermarked_img = self.apply_watermark_to_image(image_path)
-            watermarked_images.append(watermarked_img)
+        # 完成未渲染的预览，使拖拽位置与当前设置同步
+        self.preview_scheduler.flush()
+        
+        # 保存当前水印设置快照，由导出对话框交给批量引擎并行处理
+        watermark_settings = self.get_watermark_settings()
         
         # 使用导出对话框保存图片
-        result = show_export_dialog(self.image_list, watermarked_images, self)
+        result = show_export_dialog(self.image_list, watermark_settings, self)
         if result == QDialog.Accepted:
             from PyQt5.QtWidgets import QMessageBox
             QMessageBox.information(self, '完成', '水印图片导出成功！')
@@ -2,18 +2,74 @@ import sys
 import os
 from PyQt5.QtWidgets import (
     QApplication, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
-    QLineEdit, QComboBox, QSlider, QSpinBox, QFileDialog, QMessageBox
+    QLineEdit, QComboBox, QSlider, QSpinBox, QFileDialog, QMessageBox, QProgressBar, QCheckBox
 )
-from PyQt5.QtCore import Qt
-from PIL import Image
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from batch_engine import BatchEngine, ExportProgress, DEFAULT_PROFILE, LOSSY_FORMATS, OUTPUT_FORMATS
+from export_manifest import ExportManifest, settings_hash
+
+def format_seconds(seconds):
+    """将秒数格式化为 时:分:秒 或 分:秒"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+class ExportWorker(QThread):
+    """在后台线程中运行批量导出，通过信号报告进度和最终的导出报告"""
+    progress = pyqtSignal(object)  # ExportProgress
+    finished_report = pyqtSignal(dict)
+
+    def __init__(self, image_list, watermark_settings, export_options, resume=True, parent=None):
+        super().__init__(parent)
+        self.image_list = image_list
+        # 输出文件夹中的任务清单记录每张图片的导出结果，再次导出时跳过未变化的图片
+        manifest = ExportManifest(export_options["output_folder"], settings_hash(watermark_settings, export_options))
+        self.engine = BatchEngine(watermark_settings, export_options, manifest=manifest, resume=resume)
+        self.stats = ExportProgress(len(image_list))
+        self._cancelled = False
+        self._paused = False
+
+    def cancel(self):
+        """停止提交新图片，正在处理的图片完成后结束（不会留下不完整的文件）"""
+        self._cancelled = True
+
+    def set_paused(self, paused):
+        self._paused = paused
+        if paused:
+            self.stats.pause()
+        else:
+            self.stats.resume()
+
+    def is_paused(self):
+        return self._paused
+
+    def run(self):
+        error = None
+        try:
+            for result in self.engine.iter_results(self.image_list, lambda: self._cancelled, self.is_paused):
+                self.stats.add(result)
+                self.progress.emit(self.stats)
+        except Exception as e:
+            # 工作进程被终止、清单无法写入等整体错误，未处理的图片不计入失败
+            error = f'{type(e).__name__}: {e}'
+        finally:
+            # 无论是否出错都发出报告，对话框才能退出导出状态
+            self.stats.resume()
+            self.stats.cancelled = self.engine.cancelled
+            report = self.stats.report()
+            report["error"] = error or self.engine.manifest.save_error
+            self.finished_report.emit(report)
 
 class PictureProcessingDialog(QDialog):
-    def __init__(self, image_list, watermarked_images=None, parent=None):
+    def __init__(self, image_list, watermark_settings=None, parent=None):
         super().__init__(parent)
         self.setWindowTitle('图片导出设置')
         self.resize(500, 400)
         self.image_list = image_list
-        self.watermarked_images = watermarked_images
+        self.watermark_settings = watermark_settings  # 水印设置快照，为 None 时仅转换格式和尺寸
+        self.worker = None
+        self.last_report = None  # 最近一次导出的报告
         self.init_ui()
 
     def init_ui(self):
@@ -60,14 +116,21 @@ class PictureProcessingDialog(QDialog):
         format_layout = QHBoxLayout()
         format_layout.addWidget(QLabel('输出格式:'))
         self.format_combo = QComboBox()
-        self.format_combo.addItems(['JPEG', 'PNG'])
+        self.format_combo.addItems(OUTPUT_FORMATS)
         self.format_combo.currentTextChanged.connect(self.on_format_changed)
         format_layout.addWidget(self.format_combo)
+        # 编码档位：在编码速度和文件体积之间取舍
+        format_layout.addWidget(QLabel('编码:'))
+        self.profile_combo = QComboBox()
+        for label, profile in (('快速', 'fast'), ('均衡', 'balanced'), ('最小体积', 'smallest')):
+            self.profile_combo.addItem(label, profile)
+        self.profile_combo.setCurrentIndex(self.profile_combo.findData(DEFAULT_PROFILE))
+        format_layout.addWidget(self.profile_combo)
         layout.addLayout(format_layout)
         
-        # JPEG质量调节
+        # 质量调节（JPEG/WebP/AVIF）
         quality_layout = QVBoxLayout()
-        quality_layout.addWidget(QLabel('JPEG质量 (0-100):'))
+        quality_layout.addWidget(QLabel('质量 (0-100):'))
         self.quality_slider = QSlider(Qt.Horizontal)
         self.quality_slider.setMinimum(0)
         self.quality_slider.setMaximum(100)
@@ -77,6 +140,10 @@ class PictureProcessingDialog(QDialog):
         self.quality_slider.valueChanged.connect(self.on_quality_changed)
         quality_layout.addWidget(self.quality_slider)
         quality_layout.addWidget(self.quality_label)
+        # 源图片为 JPEG 时沿用其量化表和色度抽样，减少重新编码的质量损失
+        self.keep_quality_check = QCheckBox('沿用原图压缩参数（源图片为 JPEG 时）')
+        self.keep_quality_check.toggled.connect(lambda: self.on_format_changed(self.format_combo.currentText()))
+        quality_layout.addWidget(self.keep_quality_check)
         layout.addLayout(quality_layout)
         
         # 尺寸调整
@@ -113,14 +180,33 @@ class PictureProcessingDialog(QDialog):
         
         layout.addLayout(resize_layout)
         
+        # 断点续传：跳过已按相同设置导出且源图片未变化的图片
+        self.resume_check = QCheckBox('跳过已导出且未变化的图片')
+        self.resume_check.setChecked(True)
+        layout.addWidget(self.resume_check)
+        
+        # 导出进度
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, max(1, len(self.image_list)))
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+        self.progress_label = QLabel('')
+        self.progress_label.setVisible(False)
+        layout.addWidget(self.progress_label)
+        
         # 按钮区域
         button_layout = QHBoxLayout()
         self.cancel_btn = QPushButton('取消')
         self.cancel_btn.clicked.connect(self.reject)
+        self.pause_btn = QPushButton('暂停')
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        self.pause_btn.setVisible(False)
         self.export_btn = QPushButton('开始导出')
         self.export_btn.clicked.connect(self.export_images)
         button_layout.addWidget(self.cancel_btn)
         button_layout.addStretch()
+        button_layout.addWidget(self.pause_btn)
         button_layout.addWidget(self.export_btn)
         layout.addLayout(button_layout)
         
@@ -136,12 +222,15 @@ class PictureProcessingDialog(QDialog):
 
     def on_format_changed(self, format_text):
         # 根据格式显示/隐藏质量调节
-        if format_text == 'JPEG':
-            self.quality_slider.setEnabled(True)
-            self.quality_label.setEnabled(True)
+        if format_text in LOSSY_FORMATS:
+            keep = format_text == 'JPEG' and self.keep_quality_check.isChecked()
+            self.quality_slider.setEnabled(not keep)
+            self.quality_label.setEnabled(not keep)
+            self.keep_quality_check.setEnabled(format_text == 'JPEG')
         else:
             self.quality_slider.setEnabled(False)
             self.quality_label.setEnabled(False)
+            self.keep_quality_check.setEnabled(False)
 
     def on_quality_changed(self, value):
         self.quality_label.setText(str(value))
@@ -161,77 +250,122 @@ class PictureProcessingDialog(QDialog):
         prefix = self.prefix_edit.text().strip()
         suffix = self.suffix_edit.text().strip()
         fmt = self.format_combo.currentText()
-        quality = self.quality_slider.value()
+        keep = fmt == 'JPEG' and self.keep_quality_check.isChecked()
+        quality = 'keep' if keep else self.quality_slider.value()
         width = self.width_spin.value()
         height = self.height_spin.value()
         percent = self.percent_spin.value()
         
-        success_count = 0
-        error_count = 0
-        
-        for i, img_path in enumerate(self.image_list):
-            try:
-                # 如果有带水印的图片数据，使用它；否则打开原始图片
-                if self.watermarked_images and i < len(self.watermarked_images):
-                    img = self.watermarked_images[i]
-                else:
-                    img = Image.open(img_path)
-                
-                # 尺寸调整
-                if percent != 100:
-                    # 百分比缩放
-                    w, h = img.size
-                    new_width = int(w * percent / 100)
-                    new_height = int(h * percent / 100)
-                    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                elif width > 0 and height > 0:
-                    # 指定宽高
-                    img = img.resize((width, height), Image.Resampling.LANCZOS)
-                elif width > 0:
-                    # 仅指定宽度，保持宽高比
-                    w, h = img.size
-                    new_height = int(h * width / w)
-                    img = img.resize((width, new_height), Image.Resampling.LANCZOS)
-                elif height > 0:
-                    # 仅指定高度，保持宽高比
-                    w, h = img.size
-                    new_width = int(w * height / h)
-                    img = img.resize((new_width, height), Image.Resampling.LANCZOS)
-                
-                # 命名规则
-                base_name = os.path.basename(img_path)
-                name, ext = os.path.splitext(base_name)
-                new_name = f"{prefix}{name}{suffix}.{fmt.lower()}"
-                output_path = os.path.join(output_folder, new_name)
-                
-                # 保存图片
-                if fmt == 'JPEG':
-                    # JPEG格式需要转换为RGB模式
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        img = img.convert('RGB')
-                    img.save(output_path, 'JPEG', quality=quality, optimize=True)
-                else:
-                    # PNG格式保持原模式
-                    img.save(output_path, 'PNG', optimize=True)
-                
-                success_count += 1
-                
-            except Exception as e:
-                print(f"导出图片失败: {img_path}, 错误: {e}")
-                error_count += 1
+        try:
+            os.makedirs(output_folder, exist_ok=True)
+        except OSError as e:
+            QMessageBox.warning(self, '警告', f'无法创建输出文件夹: {e}')
+            return
+
+        # 逐张流式处理：每张图片添加水印、缩放、编码写盘后立即释放
+        export_options = {
+            "output_folder": output_folder,
+            "prefix": prefix,
+            "suffix": suffix,
+            "format": fmt,
+            "quality": quality,
+            "profile": self.profile_combo.currentData(),
+            "width": width,
+            "height": height,
+            "percent": percent
+        }
+        self.start_export(export_options)
+
+    def start_export(self, export_options):
+        """在后台线程中开始导出，导出期间对话框保持响应"""
+        self.worker = ExportWorker(self.image_list, self.watermark_settings, export_options,
+                                   self.resume_check.isChecked(), self)
+        self.worker.progress.connect(self.on_export_progress)
+        self.worker.finished_report.connect(self.on_export_finished)
+        self.set_exporting(True)
+        self.worker.start()
+
+    def set_exporting(self, exporting):
+        """切换导出中/空闲状态的界面"""
+        for widget in (self.output_folder_edit, self.output_folder_btn, self.prefix_edit, self.suffix_edit,
+                       self.format_combo, self.profile_combo, self.width_spin, self.height_spin, self.percent_spin,
+                       self.resume_check, self.export_btn):
+            widget.setEnabled(not exporting)
+        if exporting:
+            self.quality_slider.setEnabled(False)
+            self.keep_quality_check.setEnabled(False)
+        else:
+            self.on_format_changed(self.format_combo.currentText())
+        self.cancel_btn.setText('停止' if exporting else '取消')
+        self.cancel_btn.setEnabled(True)
+        self.pause_btn.setText('暂停')
+        self.pause_btn.setVisible(exporting)
+        if exporting:
+            self.progress_bar.setValue(0)
+            self.progress_label.setText(f'正在导出水印图片... (0/{len(self.image_list)})')
+            self.progress_bar.setVisible(True)
+            self.progress_label.setVisible(True)
+
+    def toggle_pause(self):
+        if self.worker is None:
+            return
+        paused = not self.worker.is_paused()
+        self.worker.set_paused(paused)
+        self.pause_btn.setText('继续' if paused else '暂停')
+        if paused:
+            self.progress_label.setText(self.progress_label.text() + '  已暂停（正在处理的图片完成后暂停）')
+
+    def on_export_progress(self, stats):
+        self.progress_bar.setValue(stats.done)
+        eta = stats.eta_seconds
+        eta_text = format_seconds(eta) if eta is not None else '--:--'
+        self.progress_label.setText(
+            f'正在导出水印图片... ({stats.done}/{stats.total})  '
+            f'{stats.images_per_second:.2f} 张/秒  {stats.megabytes_per_second:.2f} MB/秒  剩余 {eta_text}')
+
+    def on_export_finished(self, report):
+        self.worker.wait()
+        self.worker = None
+        self.last_report = report
+        self.set_exporting(False)
+        summary = f'成功导出 {report["succeeded"]} 张图片，失败 {report["failed"]} 张图片\n'
+        if report["skipped"]:
+            summary += f'其中 {report["skipped"]} 张未变化，已跳过\n'
+        summary += f'耗时 {format_seconds(report["elapsed_seconds"])}，共写入 {report["megabytes_written"]} MB'
         
         # 显示导出结果
-        if error_count == 0:
-            QMessageBox.information(self, '导出完成', 
-                                   f'成功导出 {success_count} 张图片到:\n{output_folder}')
+        if report["error"]:
+            self.show_report('导出中断', summary + f'\n\n导出出错: {report["error"]}', report, QMessageBox.Critical)
+        elif report["cancelled"]:
+            self.show_report('导出已取消', summary, report, QMessageBox.Information)
+        elif report["failed"] == 0:
+            self.show_report('导出完成', summary + f'\n输出文件夹:\n{self.output_folder_edit.text().strip()}',
+                             report, QMessageBox.Information)
             self.accept()
         else:
-            QMessageBox.warning(self, '导出结果', 
-                              f'成功导出 {success_count} 张图片\n失败 {error_count} 张图片')
+            self.show_report('导出结果', summary, report, QMessageBox.Warning)
+
+    def show_report(self, title, text, report, icon):
+        """显示导出结果，失败的图片及错误原因放在详细信息中"""
+        box = QMessageBox(icon, title, text, QMessageBox.Ok, self)
+        if report["failures"]:
+            box.setDetailedText('\n'.join(f'{f["source"]}: {f["error"]}' for f in report["failures"]))
+        box.exec()
+
+    def reject(self):
+        """导出过程中点击取消/关闭时停止导出（等待正在处理的图片完成）"""
+        if self.worker is not None:
+            self.cancel_btn.setEnabled(False)
+            self.pause_btn.setEnabled(False)
+            self.progress_label.setText('正在停止导出...')
+            self.worker.set_paused(False)
+            self.worker.cancel()
+            return
+        super().reject()
 
-def show_export_dialog(image_list, watermarked_images=None, parent=None):
+def show_export_dialog(image_list, watermark_settings=None, parent=None):
     """显示导出对话框的便捷函数"""
-    dialog = PictureProcessingDialog(image_list, watermarked_images, parent)
+    dialog = PictureProcessingDialog(image_list, watermark_settings, parent)
     return dialog.exec()
 
 if __name__ == '__main__':
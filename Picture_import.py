@@ -1,25 +1,42 @@
 import sys
 import os
 from PyQt5.QtWidgets import (
-    QApplication, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QListWidget, QListWidgetItem,
+    QApplication, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QListView,
     QFileDialog
 )
-from PyQt5.QtGui import QPixmap, QIcon
-from PyQt5.QtCore import Qt, QSize
-
-SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
-
-class ImageItem(QListWidgetItem):
-    def __init__(self, image_path):
-        super().__init__(os.path.basename(image_path))
-        self.image_path = image_path
+from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal
+from image_list_model import ImageListModel
+from folder_scanner import DEFAULT_SCAN_WORKERS, is_supported_image, iter_image_batches
+
+class FolderScanThread(QThread):
+    """在后台线程中递归扫描文件夹，按批通过 batch_found 信号产出图片路径"""
+    batch_found = pyqtSignal(list)
+
+    def __init__(self, paths, parent=None):
+        super().__init__(parent)
+        self.paths = paths
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        # 扫描线程只负责发现文件，去重在界面线程中完成
+        for batch in iter_image_batches(self.paths, workers=DEFAULT_SCAN_WORKERS,
+                                        is_cancelled=lambda: self.cancelled):
+            if self.cancelled:
+                return
+            self.batch_found.emit(batch)
 
 class PhotoWatermarkApp(QDialog):
     def __init__(self):
         super().__init__()
         self.setWindowTitle('图片导入工具')
         self.resize(700, 500)
-        self.image_list = []
+        # 列表模型只保存路径，缩略图按可见行异步加载
+        self.list_model = ImageListModel(self)
+        self.image_list = self.list_model.paths
+        self.scan_threads = []
         self.init_ui()
 
     def init_ui(self):
@@ -47,12 +64,14 @@ class PhotoWatermarkApp(QDialog):
         layout.addLayout(import_layout)
 
         # 图片列表
-        self.list_widget = QListWidget()
-        self.list_widget.setViewMode(QListWidget.IconMode)
-        self.list_widget.setIconSize(QSize(100, 100))
-        self.list_widget.setSpacing(10)
+        self.list_view = QListView()
+        self.list_view.setViewMode(QListView.IconMode)
+        self.list_view.setResizeMode(QListView.Adjust)
+        self.list_view.setIconSize(QSize(100, 100))
+        self.list_view.setSpacing(10)
+        self.list_model.attach(self.list_view)
         layout.addWidget(QLabel('已导入图片列表:'))
-        layout.addWidget(self.list_widget)
+        layout.addWidget(self.list_view)
 
         # 底部按钮
         button_layout = QHBoxLayout()
@@ -74,6 +93,11 @@ class PhotoWatermarkApp(QDialog):
         # 关闭窗口并返回接受结果
         self.accept()
 
+    def done(self, result):
+        # 关闭窗口时停止未完成的文件夹扫描
+        self.cancel_scans()
+        super().done(result)
+
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
             event.accept()
@@ -82,30 +106,28 @@ class PhotoWatermarkApp(QDialog):
 
     def dropEvent(self, event):
         files = []
+        folders = []
         for url in event.mimeData().urls():
             path = url.toLocalFile()
             if os.path.isdir(path):
                 # 导入整个文件夹
-                for root, _, fs in os.walk(path):
-                    for f in fs:
-                        fpath = os.path.join(root, f)
-                        if self.is_supported_image(fpath):
-                            files.append(fpath)
+                folders.append(path)
             elif self.is_supported_image(path):
                 # 导入单张图片
                 files.append(path)
         
         if files:
             self.add_images(files)
+        if folders:
+            self.scan_folders(folders)
 
     def is_supported_image(self, path):
-        ext = os.path.splitext(path)[1].lower()
-        return ext in SUPPORTED_FORMATS
+        return is_supported_image(path)
 
     def import_images(self):
         # 弹出文件选择器，支持多选
         files, _ = QFileDialog.getOpenFileNames(self, '选择图片', '',
-                                                '图片文件 (*.jpg *.jpeg *.png *.bmp *.tiff)')
+                                                '图片文件 (*.jpg *.jpeg *.png *.bmp *.tif *.tiff)')
         if files:
             self.add_images(files)
 
@@ -113,31 +135,42 @@ class PhotoWatermarkApp(QDialog):
         # 选择文件夹
         folder = QFileDialog.getExistingDirectory(self, '选择图片文件夹')
         if folder:
-            files = []
-            for root, _, fs in os.walk(folder):
-                for f in fs:
-                    path = os.path.join(root, f)
-                    if self.is_supported_image(path):
-                        files.append(path)
-            if files:
-                self.add_images(files)
-
-    def add_images(self, files):
-        for f in files:
-            if os.path.isfile(f) and self.is_supported_image(f) and f not in self.image_list:
-                self.add_image(f)
-
-    def add_image(self, path):
-        item = ImageItem(path)
-        pixmap = QPixmap(path)
-        icon = QIcon(pixmap.scaled(100, 100, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-        item.setIcon(icon)
-        self.list_widget.addItem(item)
-        self.image_list.append(path)
+            self.scan_folders([folder])
+
+    def scan_folders(self, folders):
+        """在后台扫描文件夹，发现的图片分批加入列表"""
+        thread = FolderScanThread(folders, self)
+        thread.batch_found.connect(lambda batch: self.on_batch_found(thread, batch))
+        thread.finished.connect(lambda: self.on_scan_finished(thread))
+        self.scan_threads.append(thread)
+        thread.start()
+
+    def on_batch_found(self, thread, batch):
+        if thread.cancelled:
+            return  # 取消前已发出、尚未处理的批次
+        self.add_images(batch, checked=True)
+
+    def on_scan_finished(self, thread):
+        if thread in self.scan_threads:
+            self.scan_threads.remove(thread)
+        thread.deleteLater()
+
+    def cancel_scans(self):
+        for thread in self.scan_threads:
+            thread.cancel()
+        for thread in self.scan_threads:
+            thread.wait()
+
+    def add_images(self, files, checked=False):
+        """添加图片（checked 为 True 表示路径来自扫描器，已确认是支持格式的文件）"""
+        if not checked:
+            files = [f for f in files if os.path.isfile(f) and self.is_supported_image(f)]
+        # 列表模型负责去重
+        self.list_model.add_paths(files)
 
     def clear_images(self):
-        self.list_widget.clear()
-        self.image_list.clear()
+        self.cancel_scans()
+        self.list_model.clear()
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
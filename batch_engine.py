@@ -0,0 +1,386 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from PIL import Image, JpegImagePlugin, features
+from export_manifest import source_signature
+from watermark_renderer import apply_watermark
+from tiled_renderer import TIFF_EXTENSIONS, apply_watermark_tiled, read_tiff_layout
+
+DEFAULT_JPEG_QUALITY = 90
+
+# 编码档位 -> 各格式的编码参数：fast 编码最快，balanced 兼顾速度和体积，smallest 体积最小（编码最慢）
+ENCODER_PROFILES = {
+    "fast": {
+        "JPEG": {"optimize": False},
+        "PNG": {"compress_level": 1},
+        "WEBP": {"method": 0},
+        "AVIF": {"speed": 10},
+    },
+    "balanced": {
+        "JPEG": {"optimize": True},
+        "PNG": {"compress_level": 6},
+        "WEBP": {"method": 4},
+        "AVIF": {"speed": 6},
+    },
+    "smallest": {
+        "JPEG": {"optimize": True, "progressive": True},
+        "PNG": {"optimize": True},
+        "WEBP": {"method": 6},
+        "AVIF": {"speed": 2},
+    },
+}
+DEFAULT_PROFILE = "balanced"
+
+# 可导出的格式（WebP 和 AVIF 需要 Pillow 编译时包含对应的编码库）
+OUTPUT_FORMATS = ['JPEG', 'PNG', 'TIFF'] + [fmt for fmt in ('WEBP', 'AVIF') if features.check(fmt.lower())]
+LOSSY_FORMATS = ('JPEG', 'WEBP', 'AVIF')  # 使用 quality 参数的格式
+
+def output_size(size, width=0, height=0, percent=100):
+    """按导出设置计算输出尺寸，不需要调整尺寸时返回 None"""
+    w, h = size
+    if percent != 100:
+        # 百分比缩放
+        return int(w * percent / 100), int(h * percent / 100)
+    elif width > 0 and height > 0:
+        # 指定宽高
+        return width, height
+    elif width > 0:
+        # 仅指定宽度，保持宽高比
+        return width, int(h * width / w)
+    elif height > 0:
+        # 仅指定高度，保持宽高比
+        return int(w * height / h), height
+    return None
+
+def resize_image(img, width=0, height=0, percent=100):
+    """按导出设置调整图片尺寸"""
+    size = output_size(img.size, width, height, percent)
+    if size is not None:
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    return img
+
+def build_output_path(img_path, output_folder, prefix='', suffix='', fmt='JPEG'):
+    """根据命名规则生成输出路径"""
+    base_name = os.path.basename(img_path)
+    name, ext = os.path.splitext(base_name)
+    new_name = f"{prefix}{name}{suffix}.{fmt.lower()}"
+    return os.path.join(output_folder, new_name)
+
+def save_image(img, output_path, fmt='JPEG', quality=90, profile=DEFAULT_PROFILE):
+    """按指定格式和编码档位（参见 ENCODER_PROFILES）编码并保存图片
+
+    JPEG 的 quality 为 'keep' 时沿用 img.info 中记录的源图片量化表和色度抽样
+    （参见 render_export_image），减少重新编码的质量损失；没有记录时使用默认质量。
+    """
+    params = dict(ENCODER_PROFILES[profile].get(fmt, {}))
+    if fmt in LOSSY_FORMATS:
+        if quality == 'keep' and fmt == 'JPEG' and img.info.get("quantization"):
+            params["qtables"] = img.info["quantization"]
+            params["subsampling"] = img.info.get("subsampling", -1)
+        else:
+            params["quality"] = DEFAULT_JPEG_QUALITY if quality == 'keep' else quality
+    if fmt == 'JPEG':
+        # JPEG格式需要转换为RGB模式
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGB')
+    elif fmt in ('WEBP', 'AVIF') and img.mode not in ('RGB', 'RGBA'):
+        # WebP/AVIF 只支持 RGB 和 RGBA 模式
+        img = img.convert('RGBA')
+    # PNG和TIFF格式保持原模式（TIFF 不压缩，可再次按分块方式处理）
+    img.save(output_path, fmt, **params)
+
+def write_atomic(output_path, write):
+    """先由 write(临时路径) 写入同目录下的临时文件再替换为目标文件，中途失败或取消不会留下不完整的文件"""
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def save_image_atomic(img, output_path, fmt='JPEG', quality=90, profile=DEFAULT_PROFILE):
+    write_atomic(output_path, lambda path: save_image(img, path, fmt, quality, profile))
+
+def tiled_layout(image_path, export_options):
+    """TIFF 原尺寸导出为 TIFF 时返回分块处理所需的布局，否则返回 None"""
+    if export_options.get("format", "JPEG") != 'TIFF' or not image_path.lower().endswith(TIFF_EXTENSIONS):
+        return None
+    if output_size((1, 1), export_options.get("width", 0), export_options.get("height", 0),
+                   export_options.get("percent", 100)) is not None:
+        return None
+    return read_tiff_layout(image_path)
+
+def render_export_image(image_path, settings, export_options, placement='position'):
+    """解码、调整尺寸并添加水印，返回待编码的图片
+
+    缩小导出时 JPEG 以降采样比例解码，水印在输出分辨率下添加（位置仍按原图坐标计算）。
+    导出 JPEG 时 RGB 图片全程保持 RGB，水印只混合到所在区域，不做整幅的模式转换；
+    源图片为 JPEG 时在 info 中记录其量化表和色度抽样，供 quality='keep' 沿用。
+    """
+    width, height = export_options.get("width", 0), export_options.get("height", 0)
+    percent = export_options.get("percent", 100)
+    # 水印可以直接合成的模式（JPEG 输出不需要 alpha 通道）
+    work_modes = ('RGB', 'RGBA') if export_options.get("format", "JPEG") == 'JPEG' else ('RGBA',)
+    with Image.open(image_path) as src:
+        full_size = src.size
+        target = output_size(full_size, width, height, percent)
+        if target is not None and target[0] < full_size[0] and target[1] < full_size[1]:
+            # JPEG 直接以 1/2、1/4、1/8 比例解码（解码尺寸不小于输出尺寸，其他格式无效果）
+            src.draft(None, target)
+        if settings is None:
+            img = src.resize(target, Image.Resampling.LANCZOS) if target else src.copy()
+            target = None
+        else:
+            # 先解码：水印为空时 apply_watermark 原样返回 src，离开 with 后文件已关闭
+            src.load()
+            img = src
+            # 同时指定宽高时可能拉伸图片，仍先添加水印再缩放，保证水印不变形
+            if target is not None and not (percent == 100 and width > 0 and height > 0):
+                # 先缩放到输出尺寸，再以输出分辨率添加水印（水印参数按比例缩放）
+                if img.mode not in ('RGB', 'RGBA'):
+                    img = img.convert('RGBA')
+                img = img.resize(target, Image.Resampling.LANCZOS)
+                target = None
+            # 解码得到的图片只在此处使用，直接在其上合成水印
+            img = apply_watermark(img if img.mode in work_modes else img.convert('RGBA'), settings,
+                                  placement=placement, inplace=True, full_size=full_size)
+        if src.format == 'JPEG':
+            img.info["quantization"] = src.quantization
+            img.info["subsampling"] = JpegImagePlugin.get_sampling(src)
+    if target is not None:
+        img = img.resize(target, Image.Resampling.LANCZOS)
+    return img
+
+def process_image(image_path, settings, export_options, placement='position', signature=False):
+    """处理单张图片：解码、调整尺寸、添加水印、编码保存
+
+    在工作进程中执行，返回可序列化的结果字典。signature 为 True 时在解码前
+    读取源图片的修改时间、大小和指纹，放在结果的 signature 中供任务清单记录。
+    """
+    start = time.perf_counter()
+    result = {"source": image_path, "output": None, "ok": False, "error": None, "seconds": 0.0, "bytes": 0,
+              "skipped": False}
+    try:
+        if signature:
+            result["signature"] = source_signature(image_path)
+        output_path = build_output_path(image_path, export_options["output_folder"],
+                                        export_options.get("prefix", ""), export_options.get("suffix", ""),
+                                        export_options.get("format", "JPEG"))
+        layout = tiled_layout(image_path, export_options)
+        if layout is not None:
+            # 未压缩的 TIFF 分块处理：只改写与水印相交的条带或图块，不解码整幅图片
+            write_atomic(output_path, lambda path: apply_watermark_tiled(
+                image_path, path, settings, placement=placement, layout=layout))
+        else:
+            img = render_export_image(image_path, settings, export_options, placement)
+            save_image_atomic(img, output_path, export_options.get("format", "JPEG"),
+                              export_options.get("quality", 90), export_options.get("profile", DEFAULT_PROFILE))
+        result["output"] = output_path
+        result["bytes"] = os.path.getsize(output_path)
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f'{type(e).__name__}: {e}'
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+class BatchEngine:
+    """多进程批量水印引擎（不依赖Qt）
+
+    settings 为水印设置快照（与模板数据格式相同，为 None 时不添加水印），export_options 为导出设置：
+    output_folder, prefix, suffix, format, quality, profile, width, height, percent。
+    placement 为水印定位方式，参见 watermark_renderer.apply_watermark。
+    manifest 为 export_manifest.ExportManifest，设置后记录每张图片的结果，
+    resume 为 True 时跳过清单中已是最新的图片。
+    """
+    def __init__(self, settings, export_options, jobs=None, placement='position', manifest=None, resume=True):
+        self.settings = settings
+        self.export_options = export_options
+        self.placement = placement
+        self.manifest = manifest
+        self.resume = resume
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        # 在途任务上限：保证每个工作进程都有待处理的任务，同时限制排队数量
+        self.max_pending = self.jobs * 2
+        self.cancelled = False
+
+    def output_path(self, image_path):
+        options = self.export_options
+        return build_output_path(image_path, options["output_folder"], options.get("prefix", ""),
+                                 options.get("suffix", ""), options.get("format", "JPEG"))
+
+    def iter_results(self, image_list, is_cancelled=None, is_paused=None):
+        """逐张处理图片并按完成顺序产出结果（流式，峰值内存与批量大小无关）
+
+        进程池中同时在处理的任务数不超过 max_pending，每张图片在工作进程中
+        编码写盘后即释放；is_cancelled() 返回 True 时停止提交新任务，
+        is_paused() 返回 True 时暂不提交新任务（已提交的任务继续完成）。
+        清单中已是最新的图片最先产出，结果中 skipped 为 True。
+        """
+        self.cancelled = False
+        if self.manifest is None:
+            yield from self._iter_process(image_list, is_cancelled, is_paused)
+            return
+
+        to_process = []
+        for image_path in image_list:
+            output_path = self.output_path(image_path)
+            if self.resume and self.manifest.is_up_to_date(image_path, output_path):
+                yield {"source": image_path, "output": output_path, "ok": True, "error": None,
+                       "seconds": 0.0, "bytes": 0, "skipped": True}
+            else:
+                to_process.append(image_path)
+        try:
+            for result in self._iter_process(to_process, is_cancelled, is_paused):
+                self.manifest.record(result)
+                yield result
+        finally:
+            self.manifest.save()
+
+    def _iter_process(self, image_list, is_cancelled, is_paused):
+        if self.jobs == 1 or len(image_list) <= 1:
+            # 单任务时直接在当前进程处理，避免进程池开销
+            for image_path in image_list:
+                while is_paused and is_paused() and not (is_cancelled and is_cancelled()):
+                    time.sleep(0.1)
+                if is_cancelled and is_cancelled():
+                    self.cancelled = True
+                    return
+                yield process_image(image_path, self.settings, self.export_options, self.placement,
+                                    self.manifest is not None)
+            return
+
+        # 使用 spawn 启动工作进程：图形界面中有其他线程持有缓存锁时 fork 出的子进程会死锁
+        executor = ProcessPoolExecutor(max_workers=min(self.jobs, len(image_list)),
+                                       mp_context=multiprocessing.get_context('spawn'))
+        try:
+            paths = iter(image_list)
+            pending = set()
+            exhausted = False
+            while True:
+                # 保持有界的在途任务窗口（暂停时不提交新任务）
+                paused = is_paused is not None and is_paused()
+                while not paused and not exhausted and len(pending) < self.max_pending:
+                    image_path = next(paths, None)
+                    if image_path is None:
+                        exhausted = True
+                        break
+                    pending.add(executor.submit(process_image, image_path, self.settings,
+                                                self.export_options, self.placement, self.manifest is not None))
+                if is_cancelled and is_cancelled():
+                    self.cancelled = True
+                    # 取消尚未开始的任务，已经开始处理的图片完成后照常产出结果
+                    for future in pending:
+                        future.cancel()
+                    for future in pending:
+                        if not future.cancelled():
+                            yield future.result()
+                    break
+                if not pending:
+                    if paused:
+                        time.sleep(0.1)
+                        continue
+                    break
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            # 取消尚未开始的任务，等待正在处理的图片完成
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, image_list, progress_callback=None, is_cancelled=None):
+        """处理全部图片，返回每张图片的结果列表（按完成顺序）
+
+        progress_callback(已完成数, 总数, 结果) 在每张图片完成后调用；
+        is_cancelled() 返回 True 时停止提交新任务并尽快返回。
+        """
+        total = len(image_list)
+        results = []
+        for result in self.iter_results(image_list, is_cancelled):
+            results.append(result)
+            if progress_callback:
+                progress_callback(len(results), total, result)
+        return results
+
+class ExportProgress:
+    """统计批量导出的进度、吞吐量和剩余时间，并生成结构化的导出报告（不依赖Qt）
+
+    暂停的时间不计入耗时，吞吐量和剩余时间只按实际处理时间和实际处理的图片计算。
+    """
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.skipped = 0
+        self.succeeded = 0
+        self.bytes_written = 0
+        self.failures = []
+        self.cancelled = False
+        self._start = time.perf_counter()
+        self._paused_at = None
+        self._paused_seconds = 0.0
+
+    def add(self, result):
+        """记录一张图片的处理结果"""
+        self.done += 1
+        if result.get("skipped"):
+            self.skipped += 1
+        if result["ok"]:
+            self.succeeded += 1
+            self.bytes_written += result.get("bytes", 0)
+        else:
+            self.failures.append({"source": result["source"], "error": result["error"]})
+
+    def pause(self):
+        if self._paused_at is None:
+            self._paused_at = time.perf_counter()
+
+    def resume(self):
+        if self._paused_at is not None:
+            self._paused_seconds += time.perf_counter() - self._paused_at
+            self._paused_at = None
+
+    @property
+    def elapsed(self):
+        now = self._paused_at if self._paused_at is not None else time.perf_counter()
+        return now - self._start - self._paused_seconds
+
+    @property
+    def processed(self):
+        """实际处理（未跳过）的图片数"""
+        return self.done - self.skipped
+
+    @property
+    def images_per_second(self):
+        elapsed = self.elapsed
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def megabytes_per_second(self):
+        elapsed = self.elapsed
+        return self.bytes_written / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta_seconds(self):
+        """预计剩余时间（秒），尚无完成的图片时为 None"""
+        rate = self.images_per_second
+        if not self.processed or rate <= 0:
+            return None
+        return (self.total - self.done) / rate
+
+    def report(self):
+        """生成可序列化的导出报告"""
+        elapsed = self.elapsed
+        return {
+            "total": self.total,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "succeeded": self.succeeded,
+            "failed": len(self.failures),
+            "cancelled": self.cancelled,
+            "elapsed_seconds": round(elapsed, 3),
+            "images_per_second": round(self.processed / elapsed, 3) if elapsed > 0 else None,
+            "megabytes_written": round(self.bytes_written / (1024 * 1024), 3),
+            "failures": self.failures
+        }
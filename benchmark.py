@@ -0,0 +1,332 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw
+import PIL
+
+try:
+    import resource  # Windows 上不可用
+except ImportError:
+    resource = None
+
+from batch_engine import ENCODER_PROFILES, OUTPUT_FORMATS, render_export_image, save_image
+from image_cache import ImageCache
+from watermark_renderer import (
+    apply_watermark, fit_preview, layer_cache, load_font, render_preview_frame, render_text_layer
+)
+
+# 分辨率（百万像素） -> 尺寸（3:2）
+RESOLUTIONS = {
+    2: (1732, 1155),
+    12: (4243, 2828),
+    24: (6000, 4000),
+    50: (8660, 5773),
+}
+
+# 模式 -> (PIL模式, 文件格式, 扩展名)
+MODES = {
+    "jpeg": ('RGB', 'JPEG', '.jpg'),
+    "png": ('RGBA', 'PNG', '.png'),
+    "palette": ('P', 'PNG', '.png'),
+}
+
+PATHS = ['text', 'image', 'tiled', 'preview', 'preview-qt', 'preview-qt-copy', 'export-25',
+         'encode-jpeg', 'encode-png', 'encode-webp', 'encode-avif', 'text-layer', 'text-layer-loop']
+
+# 编码路径 -> 输出格式，每个编码档位分别测量耗时和输出字节数
+ENCODE_PATHS = {
+    'encode-jpeg': 'JPEG',
+    'encode-png': 'PNG',
+    'encode-webp': 'WEBP',
+    'encode-avif': 'AVIF',
+}
+
+PREVIEW_SIZE = (500, 400)  # 与 WatermarkApp.preview_label 大小一致
+EXPORT_PERCENT = 25  # export-25 路径的导出缩放比例（不含编码）
+
+# 与模板数据格式相同的水印设置
+TEXT_SETTINGS = {
+    "watermark_type": "text",
+    "text_content": "watermark",
+    "font_name": "Arial",
+    "font_size": 96,
+    "bold": False,
+    "italic": False,
+    "text_color": [255, 255, 255, 255],
+    "opacity": 80,
+    "position": [100, 100],
+    "rotation": 30,
+    "scale": 200,
+    "shadow_enabled": True,
+    "stroke_enabled": True,
+    "grid_position": 4,
+    "image_path": "",
+    "image_opacity": 80,
+    "image_scale": 100
+}
+IMAGE_SETTINGS = dict(TEXT_SETTINGS, watermark_type="image")
+# 平铺路径：文本水印斜向平铺覆盖整幅图片
+TILED_SETTINGS = dict(TEXT_SETTINGS, tiled=True, tile_spacing=100, tile_stagger=50)
+# 文本图层路径：常用的大字号（640pt），不旋转不缩放，只测量文字光栅化和文本效果
+LAYER_SETTINGS = dict(TEXT_SETTINGS, font_size=640, scale=100, rotation=0, italic=True)
+
+def render_text_layer_loop(settings):
+    """旧版文本图层渲染（逐偏移多次绘制描边、阴影和斜体），作为 text-layer 路径的对照"""
+    text = settings["text_content"]
+    r, g, b = settings["text_color"][:3]
+    color = (r, g, b, int(255 * settings["opacity"] / 100.0))
+    scale_factor = settings["scale"] / 100.0
+    font = load_font(settings["font_name"], max(10, int(settings["font_size"] * scale_factor)),
+                     settings["bold"], settings["italic"])
+    bbox = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)
+    w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    txt_img = Image.new('RGBA', (w, h), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(txt_img)
+    x, y = -bbox[0], -bbox[1]
+    black = (0, 0, 0, color[3])
+    if settings["shadow_enabled"]:
+        draw.text((x + 2, y + 2), text, font=font, fill=black)
+    if settings["stroke_enabled"]:
+        for dx in range(-2, 3):
+            for dy in range(-2, 3):
+                if dx != 0 or dy != 0:
+                    draw.text((x + dx, y + dy), text, font=font, fill=black)
+    if settings["italic"]:
+        for offset in range(3):
+            draw.text((x + offset, y), text, font=font, fill=(r, g, b, int(color[3] * (1.0 - offset * 0.2))))
+    else:
+        draw.text((x, y), text, font=font, fill=color)
+    if settings["rotation"] != 0:
+        txt_img = txt_img.rotate(settings["rotation"], expand=1, center=(w//2, h//2))
+    if scale_factor > 1.0:
+        s = min(3.0, scale_factor)
+        txt_img = txt_img.resize((int(txt_img.width * s), int(txt_img.height * s)), Image.LANCZOS)
+    return txt_img
+
+def make_synthetic_image(size, mode, seed=0):
+    """生成可复现的合成图片（渐变 + 噪声纹理，接近照片的压缩特性）"""
+    rng = random.Random(seed)
+    w, h = size
+    tile = Image.frombytes('RGB', (256, 256), rng.randbytes(256 * 256 * 3))
+    noise = tile.resize((w, h), Image.BICUBIC)
+    gradient = Image.merge('RGB', (
+        Image.linear_gradient('L').resize((w, h)),
+        Image.radial_gradient('L').resize((w, h)),
+        Image.linear_gradient('L').rotate(90).resize((w, h)),
+    ))
+    img = Image.blend(gradient, noise, 0.35)
+    if mode == 'RGBA':
+        img = img.convert('RGBA')
+        img.putalpha(Image.linear_gradient('L').resize((w, h)).point(lambda p: 128 + p // 2))
+    elif mode == 'P':
+        img = img.quantize(colors=256)
+    return img
+
+def make_synthetic_logo(size=(800, 400)):
+    """生成可复现的半透明图片水印"""
+    logo = Image.new('RGBA', size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(logo)
+    draw.ellipse((10, 10, size[1] - 10, size[1] - 10), fill=(200, 30, 60, 220))
+    draw.rectangle((size[1], size[1] // 4, size[0] - 10, size[1] * 3 // 4), fill=(30, 60, 200, 180))
+    return logo
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB）
+
+    Linux 上读取 VmHWM：ru_maxrss 在 exec 后仍保留父进程的峰值，spawn 出的子进程也会偏大。
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_case(path_name, source_path, logo_path, iterations, cold, font_name, profile=None):
+    """在独立进程中运行单个基准用例，返回统计结果"""
+    image_cache = ImageCache()
+    image_settings = dict(IMAGE_SETTINGS, image_path=logo_path)
+    text_settings = dict(TEXT_SETTINGS, font_name=font_name)
+    tiled_settings = dict(TILED_SETTINGS, font_name=font_name)
+    layer_settings = dict(LAYER_SETTINGS, font_name=font_name)
+    with Image.open(source_path) as src:
+        size = src.size
+    megapixels = size[0] * size[1] / 1e6
+    encoded = None
+
+    # 编码路径使用预先添加水印的图片，只测量编码
+    if path_name.startswith('encode'):
+        with Image.open(source_path) as src:
+            watermarked = apply_watermark(src.convert('RGBA'), text_settings, inplace=True)
+
+    def once():
+        nonlocal encoded
+        if cold:
+            layer_cache.clear()
+            image_cache.invalidate()
+        if path_name == 'text':
+            with Image.open(source_path) as src:
+                apply_watermark(src.convert('RGBA'), text_settings, inplace=True)
+        elif path_name == 'image':
+            with Image.open(source_path) as src:
+                apply_watermark(src.convert('RGBA'), image_settings, inplace=True)
+        elif path_name == 'tiled':
+            with Image.open(source_path) as src:
+                apply_watermark(src.convert('RGBA'), tiled_settings, inplace=True)
+        elif path_name == 'preview':
+            preview, full_size = image_cache.get_proxy(source_path, PREVIEW_SIZE)
+            render_preview_frame(preview, full_size, text_settings)
+        elif path_name in ('preview-qt', 'preview-qt-copy'):
+            # 预览帧转换为 QImage（不需要 QApplication）；-copy 为旧版的复制转换，作为对照
+            from thumbnail_loader import pil_to_qimage, pil_to_shared_qimage
+            preview, full_size = image_cache.get_proxy(source_path, PREVIEW_SIZE)
+            frame, _ = render_preview_frame(preview, full_size, text_settings)
+            frame = fit_preview(frame, PREVIEW_SIZE)
+            (pil_to_shared_qimage if path_name == 'preview-qt' else pil_to_qimage)(frame)
+        elif path_name == 'export-25':
+            render_export_image(source_path, text_settings, {"percent": EXPORT_PERCENT})
+        elif path_name in ENCODE_PATHS:
+            buffer = io.BytesIO()
+            save_image(watermarked, buffer, ENCODE_PATHS[path_name], 90, profile)
+            encoded = buffer.tell()
+        elif path_name == 'text-layer':
+            # 文本图层渲染与图片尺寸无关，每次都清空图层缓存
+            layer_cache.clear()
+            render_text_layer(layer_settings)
+        elif path_name == 'text-layer-loop':
+            render_text_layer_loop(layer_settings)
+
+    once()  # 预热（字体、缓存、代理图）
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        once()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    # 单独测量一次的内存分配（tracemalloc 会拖慢执行，不计入耗时）：
+    # Pillow 新建的图片数，以及 Python 堆上的分配峰值（如 tobytes 的缓冲区）
+    new_count = Image.core.get_stats()["new_count"]
+    tracemalloc.start()
+    once()
+    python_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    pil_images = Image.core.get_stats()["new_count"] - new_count
+
+    total_seconds = sum(latencies) / 1000
+    return {
+        "path": path_name,
+        "profile": profile,
+        "megapixels": round(megapixels, 1),
+        "iterations": iterations,
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "images_per_second": round(iterations / total_seconds, 2) if total_seconds else None,
+        "megapixels_per_second": round(iterations * megapixels / total_seconds, 1) if total_seconds else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1) if resource is not None else None,
+        "pil_images_per_iteration": pil_images,
+        "python_alloc_peak_kb": round(python_peak / 1024, 1),
+        "encoded_bytes": encoded
+    }
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='水印渲染与导出路径的性能基准（无需图形界面）',
+        epilog='示例: python benchmark.py --quick --json result.json\n'
+               '      python benchmark.py --sizes 2 --modes jpeg --paths text-layer,text-layer-loop\n'
+               '      python benchmark.py --sizes 12 --modes png --paths encode-png,encode-webp --profiles fast,balanced',
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(str(s) for s in RESOLUTIONS),
+                        help='分辨率（百万像素），逗号分隔，可选: ' + ','.join(str(s) for s in RESOLUTIONS))
+    parser.add_argument('--modes', default=','.join(MODES), help='图片模式，逗号分隔，可选: ' + ','.join(MODES))
+    parser.add_argument('--paths', default=','.join(PATHS), help='测试路径，逗号分隔，可选: ' + ','.join(PATHS))
+    parser.add_argument('--profiles', default=','.join(ENCODER_PROFILES),
+                        help='编码路径测试的编码档位，逗号分隔，可选: ' + ','.join(ENCODER_PROFILES)
+                             + '（smallest 的 PNG 在大图上很慢）')
+    parser.add_argument('-n', '--iterations', type=int, default=5, help='每个用例的计时次数')
+    parser.add_argument('--font', default=TEXT_SETTINGS["font_name"], help='文本水印使用的字体名称')
+    parser.add_argument('--cold', action='store_true', help='每次迭代前清空图层缓存和图片缓存')
+    parser.add_argument('--quick', action='store_true', help='仅测试 2MP 和 12MP')
+    parser.add_argument('--json', default=None, help='将结果写入JSON文件，便于版本间对比')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sizes = [2, 12] if args.quick else [int(s) for s in args.sizes.split(',')]
+    modes = args.modes.split(',')
+    paths = args.paths.split(',')
+    profiles = args.profiles.split(',')
+    for values, valid in ((sizes, RESOLUTIONS), (modes, MODES), (paths, PATHS), (profiles, ENCODER_PROFILES)):
+        unknown = [v for v in values if v not in valid]
+        if unknown:
+            sys.exit(f'未知的参数值: {unknown}')
+    unsupported = [p for p in paths if p in ENCODE_PATHS and ENCODE_PATHS[p] not in OUTPUT_FORMATS]
+    if unsupported:
+        print(f'当前 Pillow 不支持的编码格式，跳过: {unsupported}', file=sys.stderr)
+        paths = [p for p in paths if p not in unsupported]
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='wm_bench_') as work_dir:
+        logo_path = os.path.join(work_dir, 'logo.png')
+        make_synthetic_logo().save(logo_path)
+        print(f"{'路径':<22}{'模式':<9}{'MP':>5}{'p50 ms':>10}{'p95 ms':>10}{'img/s':>8}{'MP/s':>8}{'RSS MB':>9}{'图片数':>6}{'分配KB':>9}{'bytes':>12}")
+        for size_mp in sizes:
+            for mode_name in modes:
+                pil_mode, fmt, ext = MODES[mode_name]
+                source_path = os.path.join(work_dir, f'{size_mp}mp_{mode_name}{ext}')
+                make_synthetic_image(RESOLUTIONS[size_mp], pil_mode, seed=size_mp).save(source_path, fmt)
+                # 编码路径按档位分别测量
+                cases = [(path_name, profile) for path_name in paths
+                         for profile in (profiles if path_name in ENCODE_PATHS else [None])]
+                for path_name, profile in cases:
+                    # 每个用例在新启动（spawn）的进程中运行，峰值内存不含父进程生成测试图片的内存
+                    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                        result = executor.submit(run_case, path_name, source_path, logo_path,
+                                                 args.iterations, args.cold, args.font, profile).result()
+                    result["mode"] = mode_name
+                    results.append(result)
+                    label = f"{path_name}:{profile}" if profile else path_name
+                    print(f"{label:<22}{mode_name:<9}{result['megapixels']:>5}{result['p50_ms']:>10}"
+                          f"{result['p95_ms']:>10}{result['images_per_second']:>8}{result['megapixels_per_second']:>8}"
+                          f"{str(result['peak_rss_mb']):>9}{result['pil_images_per_iteration']:>6}"
+                          f"{result['python_alloc_peak_kb']:>9}{str(result['encoded_bytes'] or ''):>12}")
+                os.remove(source_path)
+
+    if args.json:
+        report = {
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "iterations": args.iterations,
+            "cold": args.cold,
+            "font": args.font,
+            "results": results
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
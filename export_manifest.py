@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import time
+
+MANIFEST_NAME = ".watermark_manifest.json"
+MANIFEST_VERSION = 1
+MANIFEST_SAVE_INTERVAL = 2.0  # 导出过程中写入清单的最短间隔（秒）
+HASH_CHUNK = 1024 * 1024
+
+def file_hash(path):
+    """计算文件完整内容的 SHA-1"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def source_signature(path):
+    """读取源图片的修改时间、大小和内容指纹（在解码前调用，与导出内容对应）"""
+    stat = os.stat(path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size, "hash": file_hash(path)}
+
+def settings_hash(settings, export_options, placement='position'):
+    """计算水印设置和导出设置的指纹（图片水印同时包含水印图片的修改时间）"""
+    options = {k: v for k, v in export_options.items() if k != "output_folder"}
+    data = {"settings": settings, "export_options": options, "placement": placement}
+    if settings is not None and settings.get("watermark_type") == 'image' and settings.get("image_path"):
+        try:
+            data["image_mtime"] = os.path.getmtime(settings["image_path"])
+        except OSError:
+            pass
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+class ExportManifest:
+    """导出任务清单：记录每张源图片的内容指纹、修改时间、设置指纹、输出路径和状态
+
+    保存在输出文件夹中。再次运行同一任务时，源图片和设置都未变化且输出文件
+    仍然存在的图片直接跳过，只重新处理变化或失败的图片。
+    """
+    def __init__(self, output_folder, settings_digest):
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.settings_digest = settings_digest
+        self.entries = {}
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.save_error = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("entries", {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """写入清单（先写临时文件再替换，崩溃时不会损坏已有清单）
+
+        输出文件夹不可写时不抛出异常，错误记录在 save_error 中，下次保存时重试。
+        """
+        from batch_engine import write_atomic  # batch_engine 导入了本模块
+        data = {"version": MANIFEST_VERSION, "entries": self.entries}
+
+        def write(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        self._last_save = time.monotonic()
+        try:
+            write_atomic(self.path, write)
+        except OSError as e:
+            self.save_error = f'任务清单无法写入: {e}'
+            return False
+        self.save_error = None
+        self._dirty = False
+        return True
+
+    def save_if_due(self):
+        """距离上次写入超过保存间隔时写入清单（崩溃后最多重做这段时间内的图片）"""
+        if self._dirty and time.monotonic() - self._last_save >= MANIFEST_SAVE_INTERVAL:
+            self.save()
+
+    def is_up_to_date(self, source, output_path):
+        """判断图片是否已按当前设置成功导出且源图片未变化
+
+        修改时间和大小未变时只需 stat；修改时间变化时比较内容指纹。
+        """
+        entry = self.entries.get(os.path.abspath(source))
+        if (entry is None or entry["status"] != "ok" or entry["settings_hash"] != self.settings_digest
+                or entry["output"] != os.path.abspath(output_path) or not os.path.exists(output_path)):
+            return False
+        try:
+            stat = os.stat(source)
+            if entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                return True
+            if entry["size"] != stat.st_size or entry["hash"] != file_hash(source):
+                return False
+        except OSError:
+            return False
+        # 文件被触碰但内容未变，更新修改时间以免下次再计算指纹
+        entry["mtime"] = stat.st_mtime
+        self._dirty = True
+        return True
+
+    def record(self, result):
+        """记录一张图片的处理结果
+
+        源图片的修改时间、大小和指纹取自结果中的 signature（工作进程在解码前读取），
+        处理期间被覆盖的源图片下次仍会重新处理。
+        """
+        source = os.path.abspath(result["source"])
+        signature = result.get("signature") or {}
+        entry = {
+            "source": source,
+            "hash": signature.get("hash"),
+            "mtime": signature.get("mtime"),
+            "size": signature.get("size"),
+            "settings_hash": self.settings_digest,
+            "output": os.path.abspath(result["output"]) if result["output"] else None,
+            "status": "ok" if result["ok"] and signature else "failed",
+            "error": result["error"]
+        }
+        self.entries[source] = entry
+        self._dirty = True
+        self.save_if_due()
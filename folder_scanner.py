@@ -0,0 +1,99 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff']
+_SUPPORTED_EXTENSIONS = frozenset(SUPPORTED_FORMATS)
+
+DEFAULT_SCAN_WORKERS = 4  # 并行遍历目录的线程数（网络共享等高延迟目录收益明显）
+DEFAULT_BATCH_SIZE = 500  # 每批产出的文件数
+
+def is_supported_image(path):
+    return os.path.splitext(path)[1].lower() in _SUPPORTED_EXTENSIONS
+
+def _scan_dir(path, skip_hidden, exclude):
+    """扫描单个目录，返回 (图片条目列表, 子目录列表)"""
+    images = []
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if skip_hidden and entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if exclude is None or os.path.abspath(entry.path) != exclude:
+                            subdirs.append(entry.path)
+                    elif is_supported_image(entry.name) and entry.is_file():
+                        images.append(entry)
+                except OSError:
+                    continue
+    except OSError:
+        pass  # 目录在扫描过程中被删除或无权限
+    images.sort(key=lambda e: e.name)
+    subdirs.sort()
+    return images, subdirs
+
+def iter_image_entries(root, workers=1, skip_hidden=False, exclude=None, is_cancelled=None):
+    """递归遍历文件夹，逐个目录产出支持格式的图片条目（os.DirEntry）
+
+    workers 大于 1 时用线程池提前并行扫描目录，产出顺序与单线程遍历相同；
+    exclude 为跳过的目录；is_cancelled() 返回 True 时停止遍历。
+    """
+    exclude = os.path.abspath(exclude) if exclude else None
+    if workers <= 1:
+        stack = [root]
+        while stack:
+            if is_cancelled and is_cancelled():
+                return
+            images, subdirs = _scan_dir(stack.pop(), skip_hidden, exclude)
+            yield from images
+            stack.extend(reversed(subdirs))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # 子目录一经发现就提交扫描，但按深度优先顺序取结果，导入顺序可重复
+        stack = [executor.submit(_scan_dir, root, skip_hidden, exclude)]
+        while stack:
+            if is_cancelled and is_cancelled():
+                for future in stack:
+                    future.cancel()
+                return
+            images, subdirs = stack.pop().result()
+            yield from images
+            stack.extend(reversed([executor.submit(_scan_dir, subdir, skip_hidden, exclude)
+                                   for subdir in subdirs]))
+
+def iter_image_batches(paths, seen=None, workers=1, batch_size=DEFAULT_BATCH_SIZE, is_cancelled=None):
+    """展开文件和文件夹，按批产出去重后的图片路径列表
+
+    seen 为已有路径的集合（O(1) 去重），新发现的路径会加入其中。
+    """
+    seen = set() if seen is None else seen
+    batch = []
+    for path in paths:
+        if os.path.isdir(path):
+            # 导入整个文件夹
+            candidates = (entry.path for entry in iter_image_entries(path, workers, is_cancelled=is_cancelled))
+        elif os.path.isfile(path) and is_supported_image(path):
+            # 导入单张图片
+            candidates = (path,)
+        else:
+            continue
+        for f in candidates:
+            if f not in seen:
+                seen.add(f)
+                batch.append(f)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if is_cancelled and is_cancelled():
+            break
+    if batch:
+        yield batch
+
+def scan_images(paths, workers=1):
+    """展开文件和文件夹，返回去重后的图片路径列表"""
+    files = []
+    for batch in iter_image_batches(paths, workers=workers):
+        files.extend(batch)
+    return files
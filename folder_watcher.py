@@ -0,0 +1,90 @@
+import os
+import time
+from folder_scanner import iter_image_entries
+
+DEFAULT_POLL_INTERVAL = 2.0  # 轮询间隔（秒）
+DEFAULT_MAX_QUEUE = 64  # 每轮最多处理的图片数，超出的留到下一轮
+
+def scan_signatures(folder, exclude=None):
+    """递归扫描文件夹，返回 {图片路径: (修改时间, 大小)}（跳过隐藏文件和 exclude 目录）"""
+    signatures = {}
+    for entry in iter_image_entries(folder, skip_hidden=True, exclude=exclude):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue  # 文件在扫描过程中被删除
+        signatures[os.path.abspath(entry.path)] = (stat.st_mtime, stat.st_size)
+    return signatures
+
+class FolderWatcher:
+    """监视输入文件夹（轮询），只把新增或修改过的图片交给批量引擎处理
+
+    engine 为设置了任务清单的 BatchEngine，清单同时作为持久化的文件签名索引：
+    重启后已成功处理且未变化的图片不会重新排队。文件签名需要在连续两次扫描中保持
+    不变才会处理，避免处理仍在写入的文件。每轮最多处理 max_queue 张图片，
+    并行进程数由 engine.jobs 限制，突发的大量文件会分多轮处理。
+    """
+    def __init__(self, input_folder, engine, interval=DEFAULT_POLL_INTERVAL, max_queue=DEFAULT_MAX_QUEUE,
+                 on_result=None):
+        self.input_folder = os.path.abspath(input_folder)
+        self.engine = engine
+        self.interval = interval
+        self.max_queue = max(1, max_queue)
+        self.on_result = on_result
+        self.stopped = False
+        # 已处理的文件签名（从任务清单恢复）：只恢复按当前设置成功导出且输出文件仍存在的图片，
+        # 设置变化或上次失败的图片在重启后重新处理
+        self.known = {}
+        manifest = engine.manifest
+        for source, entry in manifest.entries.items():
+            if (entry.get("mtime") is not None and entry["status"] == "ok"
+                    and entry["settings_hash"] == manifest.settings_digest
+                    and entry["output"] and os.path.exists(entry["output"])):
+                self.known[source] = (entry["mtime"], entry["size"])
+        self._candidates = {}  # 上一轮发现的新签名，等待确认写入完成
+
+    def scan(self):
+        """扫描一次，返回签名已稳定的新增或修改过的图片（按路径排序）"""
+        output_folder = os.path.abspath(self.engine.export_options["output_folder"])
+        signatures = scan_signatures(self.input_folder, exclude=output_folder)
+        ready = []
+        candidates = {}
+        for path, signature in signatures.items():
+            if self.known.get(path) == signature:
+                continue
+            if self._candidates.get(path) == signature:
+                ready.append(path)
+            else:
+                candidates[path] = signature
+        # 已稳定但本轮未能处理的文件保留为候选，下一轮直接处理
+        ready.sort()
+        for path in ready[self.max_queue:]:
+            candidates[path] = signatures[path]
+        self._candidates = candidates
+        return [(path, signatures[path]) for path in ready[:self.max_queue]]
+
+    def run_once(self, is_cancelled=None):
+        """扫描并处理一轮，返回本轮处理的图片数"""
+        batch = self.scan()
+        if not batch:
+            return 0
+        signatures = dict(batch)
+        count = 0
+        for result in self.engine.iter_results([path for path, _ in batch], is_cancelled):
+            # 失败的图片同样记录签名，文件再次变化时才重试
+            self.known[result["source"]] = signatures[result["source"]]
+            count += 1
+            if self.on_result:
+                self.on_result(result)
+        return count
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        """持续监视直到调用 stop()"""
+        while not self.stopped:
+            self.run_once(lambda: self.stopped)
+            deadline = time.monotonic() + self.interval
+            while not self.stopped and time.monotonic() < deadline:
+                time.sleep(min(0.2, self.interval))
@@ -0,0 +1,192 @@
+import json
+import os
+import sys
+import threading
+from functools import lru_cache
+from PIL import ImageFont
+
+# 字体名称映射，将常见的中文字体名称映射到系统字体文件
+FONT_MAPPING = {
+    "SimHei": "simhei.ttf",  # 黑体
+    "Microsoft YaHei": "msyh.ttc",  # 微软雅黑
+    "SimSun": "simsun.ttc",  # 宋体
+    "Arial": "arial.ttf",
+    "Times New Roman": "times.ttf"
+}
+
+FONT_EXTENSIONS = ('.ttf', '.ttc', '.otf', '.otc')
+FALLBACK_FONT_FILE = "arial.ttf"
+MAX_FACES_PER_FILE = 32  # 字体集合文件（.ttc）中读取的最大字形数
+DEFAULT_INDEX_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'photo_watermark', 'font_index.json')
+INDEX_VERSION = 1
+
+def system_font_dirs():
+    """返回当前系统的字体目录"""
+    home = os.path.expanduser('~')
+    if sys.platform.startswith('win'):
+        dirs = [os.path.join(os.environ.get('WINDIR', r'C:\Windows'), 'Fonts')]
+        local = os.environ.get('LOCALAPPDATA')
+        if local:
+            dirs.append(os.path.join(local, 'Microsoft', 'Windows', 'Fonts'))
+    elif sys.platform == 'darwin':
+        dirs = ['/System/Library/Fonts', '/Library/Fonts', os.path.join(home, 'Library', 'Fonts')]
+    else:
+        data_home = os.environ.get('XDG_DATA_HOME', os.path.join(home, '.local', 'share'))
+        dirs = ['/usr/share/fonts', '/usr/local/share/fonts',
+                os.path.join(data_home, 'fonts'), os.path.join(home, '.fonts')]
+    return [d for d in dirs if os.path.isdir(d)]
+
+def _read_faces(path):
+    """读取字体文件中每个字形的 (字体族, 样式)"""
+    faces = []
+    for index in range(MAX_FACES_PER_FILE):
+        try:
+            family, style = ImageFont.truetype(path, 12, index=index).getname()
+        except Exception:
+            break  # 超出字体集合中的字形数量
+        faces.append([family or "", style or ""])
+    return faces
+
+@lru_cache(maxsize=64)
+def _load_truetype(path, index, size):
+    """加载字体对象，按 (文件, 字形索引, 字号) 缓存"""
+    return ImageFont.truetype(path, size, encoding="unic", index=index)
+
+@lru_cache(maxsize=1)
+def _load_default():
+    return ImageFont.load_default()
+
+class FontRegistry:
+    """系统字体注册表：扫描一次字体目录，把字体族/样式解析为字体文件和字形索引
+
+    扫描结果按文件修改时间持久化到磁盘，下次启动只重新读取变化的文件。
+    """
+    def __init__(self, font_dirs=None, index_file=DEFAULT_INDEX_FILE):
+        self.font_dirs = font_dirs
+        self.index_file = index_file
+        self.by_filename = {}  # 文件名（小写） -> 路径
+        self.by_family = {}  # 字体族（小写） -> {样式（小写）: (路径, 字形索引)}
+        self.family_of = {}  # (路径, 字形索引) -> 字体族（小写）
+        self._resolved = {}
+        self._scanned = False
+        self._lock = threading.Lock()
+
+    def _ensure_scanned(self):
+        with self._lock:
+            if not self._scanned:
+                self._scan()
+                self._scanned = True
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                return data.get("files", {})
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def _save_index(self, files):
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            tmp_path = f"{self.index_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": INDEX_VERSION, "files": files}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_file)
+        except OSError:
+            pass  # 索引只是加速，写入失败不影响使用
+
+    def _scan(self):
+        """扫描字体目录并建立索引"""
+        cached = self._load_index()
+        files = {}
+        changed = False
+        font_dirs = self.font_dirs if self.font_dirs is not None else system_font_dirs()
+        for font_dir in font_dirs:
+            for root, _, fs in os.walk(font_dir):
+                for name in fs:
+                    if not name.lower().endswith(FONT_EXTENSIONS):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entry = cached.get(path)
+                    if entry is None or entry["mtime"] != stat.st_mtime or entry["size"] != stat.st_size:
+                        entry = {"mtime": stat.st_mtime, "size": stat.st_size, "faces": _read_faces(path)}
+                        changed = True
+                    files[path] = entry
+        if changed or len(files) != len(cached):
+            self._save_index(files)
+
+        for path in sorted(files):
+            self.by_filename.setdefault(os.path.basename(path).lower(), path)
+            for index, (family, style) in enumerate(files[path]["faces"]):
+                family_key = family.lower()
+                self.family_of[(path, index)] = family_key
+                self.by_family.setdefault(family_key, {}).setdefault(style.lower(), (path, index))
+
+    def _find_base(self, font_name):
+        """查找字体名称对应的常规字形，返回 (路径, 字形索引) 或 None"""
+        font_file = FONT_MAPPING.get(font_name, font_name)
+        if os.path.isfile(font_file):
+            # 直接指定的字体文件路径
+            return (os.path.abspath(font_file), 0)
+        path = self.by_filename.get(os.path.basename(font_file).lower())
+        if path is None and not os.path.splitext(font_file)[1]:
+            path = self.by_filename.get(font_file.lower() + '.ttf')
+        if path is not None:
+            return (path, 0)
+        styles = self.by_family.get(font_name.lower())
+        if styles:
+            for style in ('regular', 'normal', 'book', 'roman', 'medium'):
+                if style in styles:
+                    return styles[style]
+            return next(iter(styles.values()))
+        return None
+
+    def resolve(self, font_name, bold=False, italic=False):
+        """解析字体，返回 (路径, 字形索引, 字号系数)，找不到任何字体时路径为 None
+
+        粗体优先使用同一字体族的 Bold/Bold Italic 字形，没有时放大字号模拟粗体。
+        """
+        key = (font_name, bool(bold), bool(italic))
+        resolved = self._resolved.get(key)
+        if resolved is not None:
+            return resolved
+
+        self._ensure_scanned()
+        base = self._find_base(font_name) or self._find_base(FALLBACK_FONT_FILE)
+        if base is None:
+            resolved = (None, 0, 1.0)
+        elif bold:
+            styles = self.by_family.get(self.family_of.get(base, ""), {})
+            face = None
+            if italic:
+                face = styles.get('bold italic') or styles.get('bold oblique')
+            face = face or styles.get('bold')
+            if face is not None:
+                resolved = face + (1.0,)
+            else:
+                # 如果没有粗体字形，使用更大的字号模拟粗体效果
+                resolved = base + (1.2 if italic else 1.1,)
+        else:
+            # 斜体效果在文本绘制中处理
+            resolved = base + (1.0,)
+        self._resolved[key] = resolved
+        return resolved
+
+    def get_font(self, font_name, font_size, bold=False, italic=False):
+        """获取字体对象（预览和导出通过同一注册表解析，保证使用相同字形）"""
+        path, index, size_factor = self.resolve(font_name, bold, italic)
+        if path is not None:
+            try:
+                return _load_truetype(path, index, max(1, int(font_size * size_factor)))
+            except OSError:
+                pass
+        # 如果都失败，使用默认字体
+        return _load_default()
+
+font_registry = FontRegistry()
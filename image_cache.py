@@ -0,0 +1,128 @@
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+# 默认缓存预算：1GB（约可容纳 4 张 60MP 的 RGBA 图片）
+DEFAULT_CACHE_BYTES = 1024 * 1024 * 1024
+
+def image_nbytes(img):
+    """估算解码后图片占用的字节数"""
+    return img.width * img.height * len(img.getbands())
+
+class ImageCache:
+    """已解码图片的LRU缓存，按 (路径, 修改时间) 索引，总字节数受预算限制
+
+    缓存中的图片是共享的，调用方只能读取，需要修改时请先 copy()。
+    """
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _make_key(self, path):
+        """生成缓存键（文件被修改后键随之变化）"""
+        path = os.path.abspath(path)
+        return (path, os.path.getmtime(path))
+
+    def get(self, path):
+        """获取 RGBA 模式的解码图片，未命中时从磁盘解码并缓存"""
+        key = self._make_key(path)
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return img
+            self.misses += 1
+
+        img = Image.open(path).convert('RGBA')
+        self._put(key, img)
+        return img
+
+    def get_proxy(self, path, max_size):
+        """获取适配 max_size 的降采样代理图，返回 (代理图, 原图尺寸)"""
+        max_w, max_h = max_size
+        key = self._make_key(path) + (int(max_w), int(max_h))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, entry.info['full_size']
+            self.misses += 1
+
+        with self._lock:
+            full = self._entries.get(key[:2])
+        if full is None:
+            with Image.open(path) as src:
+                full_size = src.size
+                ratio = min(max_w / src.width, max_h / src.height)
+                if ratio >= 1.0:
+                    # 原图已小于目标尺寸，直接使用原图
+                    full = src.convert('RGBA')
+                    self._put(key[:2], full)
+                    return full, full_size
+                proxy_size = (max(1, int(src.width * ratio)), max(1, int(src.height * ratio)))
+                # 原图未缓存时 JPEG 直接以 1/2、1/4、1/8 比例解码，不必解码完整的原图
+                src.draft(None, proxy_size)
+                decoded = src.convert('RGBA')
+        else:
+            full_size = full.size
+            ratio = min(max_w / full.width, max_h / full.height)
+            if ratio >= 1.0:
+                return full, full_size
+            proxy_size = (max(1, int(full.width * ratio)), max(1, int(full.height * ratio)))
+            decoded = full
+        proxy = decoded.resize(proxy_size, Image.LANCZOS, reducing_gap=3.0)
+        proxy.info['full_size'] = full_size
+        self._put(key, proxy)
+        return proxy, full_size
+
+    def _put(self, key, img):
+        """放入缓存并按LRU顺序淘汰超出预算的条目"""
+        size = image_nbytes(img)
+        if size > self.max_bytes:
+            # 单张图片超过预算时不缓存
+            return
+        with self._lock:
+            # 同一路径的旧版本（修改时间不同）已失效，直接移除
+            for old_key in [k for k in self._entries if k[0] == key[0] and k[1] != key[1]]:
+                self.current_bytes -= image_nbytes(self._entries.pop(old_key))
+            if key in self._entries:
+                self.current_bytes -= image_nbytes(self._entries.pop(key))
+            self._entries[key] = img
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= image_nbytes(evicted)
+                self.evictions += 1
+
+    def invalidate(self, path=None):
+        """移除指定路径的缓存，不传路径时清空全部缓存"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self.current_bytes = 0
+                return
+            path = os.path.abspath(path)
+            for key in [k for k in self._entries if k[0] == path]:
+                self.current_bytes -= image_nbytes(self._entries.pop(key))
+
+    def stats(self):
+        """返回命中/未命中计数和内存占用，用于调整缓存大小"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes
+            }
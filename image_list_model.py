@@ -0,0 +1,108 @@
+import os
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QIcon, QPixmap
+from PyQt5.QtWidgets import QListView
+from thumbnail_loader import ThumbnailLoader
+
+ICON_CACHE_SIZE = 512  # 内存中保留的缩略图图标数（远大于一屏可见的数量）
+PATH_ROLE = Qt.UserRole
+
+class ImageListModel(QAbstractListModel):
+    """图片列表模型：只保存路径，缩略图在视图请求可见行时才异步加载
+
+    已加载的图标保存在LRU缓存中，内存占用与导入的图片数量无关。
+    """
+    def __init__(self, parent=None, icon_cache_size=ICON_CACHE_SIZE):
+        super().__init__(parent)
+        self.paths = []
+        self._rows = {}  # 路径 -> 行号，用于 O(1) 去重和缩略图回填
+        self._icons = OrderedDict()
+        self._failed = set()  # 无法生成缩略图的图片，不再重复请求
+        self.icon_cache_size = icon_cache_size
+        self.thumbnail_loader = ThumbnailLoader(parent=self)
+        self.thumbnail_loader.thumbnail_ready.connect(self._on_thumbnail_ready)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        path = self.paths[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(path)
+        if role == Qt.ToolTipRole or role == PATH_ROLE:
+            return path
+        if role == Qt.DecorationRole:
+            icon = self._icons.get(path)
+            if icon is not None:
+                self._icons.move_to_end(path)
+                return icon
+            if path not in self._failed:
+                # 视图只为可见的行请求图标
+                self.thumbnail_loader.request(path)
+        return None
+
+    def contains(self, path):
+        return path in self._rows
+
+    def path(self, row):
+        return self.paths[row]
+
+    def add_paths(self, paths):
+        """追加图片（忽略已存在的路径），返回新增的数量"""
+        new_paths = []
+        for path in paths:
+            if path not in self._rows:
+                self._rows[path] = len(self.paths) + len(new_paths)
+                new_paths.append(path)
+        if new_paths:
+            first = len(self.paths)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_paths) - 1)
+            self.paths.extend(new_paths)
+            self.endInsertRows()
+        return len(new_paths)
+
+    def set_paths(self, paths):
+        self.beginResetModel()
+        self._reset()
+        self.endResetModel()
+        self.add_paths(paths)
+
+    def clear(self):
+        self.beginResetModel()
+        self._reset()
+        self.endResetModel()
+
+    def _reset(self):
+        self.thumbnail_loader.cancel_pending()
+        self.paths.clear()
+        self._rows.clear()
+        self._icons.clear()
+        self._failed.clear()
+
+    def cancel_pending_thumbnails(self):
+        """放弃尚未开始的缩略图任务（滚动后仍可见的行会在重绘时重新请求）"""
+        self.thumbnail_loader.cancel_pending()
+
+    def attach(self, view):
+        """将模型设置到视图，并按虚拟列表的需要配置视图"""
+        view.setModel(self)
+        view.setUniformItemSizes(True)  # 布局时不必逐行计算尺寸
+        view.setLayoutMode(QListView.Batched)
+        view.verticalScrollBar().valueChanged.connect(self.cancel_pending_thumbnails)
+
+    def _on_thumbnail_ready(self, path, qimg):
+        row = self._rows.get(path)
+        if row is None:
+            return  # 列表已清空
+        if qimg.isNull():
+            self._failed.add(path)
+            return
+        self._icons[path] = QIcon(QPixmap.fromImage(qimg))
+        self._icons.move_to_end(path)
+        while len(self._icons) > self.icon_cache_size:
+            self._icons.popitem(last=False)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
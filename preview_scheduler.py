@@ -0,0 +1,120 @@
+import time
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+PREVIEW_DEBOUNCE_MS = 10  # 合并连续变化事件的等待时间
+
+class _RenderSignals(QObject):
+    finished = pyqtSignal(int, object, object, float)
+
+class _RenderTask(QRunnable):
+    def __init__(self, render, snapshot, generation, signals):
+        super().__init__()
+        self.render = render
+        self.snapshot = snapshot
+        self.generation = generation
+        self.signals = signals
+
+    def run(self):
+        start = time.perf_counter()
+        result, error = None, None
+        try:
+            result = self.render(self.snapshot)
+        except Exception as e:
+            error = e
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.signals.finished.emit(self.generation, result, error, elapsed_ms)
+
+class PreviewScheduler(QObject):
+    """预览渲染调度器：合并突发的变化事件，同一时间最多一个渲染任务在后台执行
+
+    prepare() 在界面线程中收集渲染所需状态，render(snapshot) 在后台线程中执行
+    且不能访问界面控件，display(result, error) 在界面线程中显示结果。
+    渲染完成时如果设置已经再次变化，该帧被丢弃并立即渲染最新状态。
+    """
+    def __init__(self, prepare, render, display, debounce_ms=PREVIEW_DEBOUNCE_MS, parent=None):
+        super().__init__(parent)
+        self.prepare = prepare
+        self.render = render
+        self.display = display
+        self.debounce_ms = debounce_ms
+        self.generation = 0  # 每次请求递增
+        self.displayed_generation = 0  # 已显示的最新请求
+        self.in_flight = False
+
+        # 帧耗时统计
+        self.frame_time_ms = 0.0
+        self.average_frame_time_ms = 0.0
+        self.frames_rendered = 0
+        self.frames_dropped = 0
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._start_render)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._signals = _RenderSignals()
+        self._signals.finished.connect(self._on_finished)
+
+    def schedule(self):
+        """请求重新渲染（短时间内的多次请求只渲染一次）"""
+        self.generation += 1
+        self.timer.start(self.debounce_ms)
+
+    def cancel(self):
+        """放弃所有未完成的请求，正在执行的结果也不会显示"""
+        self.timer.stop()
+        self.generation += 1
+        self.displayed_generation = self.generation
+
+    def flush(self):
+        """立即在当前线程渲染并显示最新状态（例如导出前同步水印位置）"""
+        self.timer.stop()
+        if self.displayed_generation == self.generation:
+            return
+        start = time.perf_counter()
+        result, error = None, None
+        try:
+            result = self.render(self.prepare())
+        except Exception as e:
+            error = e
+        self._record_frame_time((time.perf_counter() - start) * 1000)
+        self.displayed_generation = self.generation
+        self.display(result, error)
+
+    def wait_for_done(self):
+        self.pool.waitForDone()
+
+    def stats(self):
+        return {
+            "frame_time_ms": self.frame_time_ms,
+            "average_frame_time_ms": self.average_frame_time_ms,
+            "frames_rendered": self.frames_rendered,
+            "frames_dropped": self.frames_dropped
+        }
+
+    def _record_frame_time(self, elapsed_ms):
+        self.frame_time_ms = elapsed_ms
+        self.frames_rendered += 1
+        if self.frames_rendered == 1:
+            self.average_frame_time_ms = elapsed_ms
+        else:
+            # 指数移动平均，反映最近的交互延迟
+            self.average_frame_time_ms = 0.8 * self.average_frame_time_ms + 0.2 * elapsed_ms
+
+    def _start_render(self):
+        if self.in_flight or self.displayed_generation == self.generation:
+            return  # 正在渲染时由完成回调继续处理
+        self.in_flight = True
+        self.pool.start(_RenderTask(self.render, self.prepare(), self.generation, self._signals))
+
+    def _on_finished(self, generation, result, error, elapsed_ms):
+        self.in_flight = False
+        self._record_frame_time(elapsed_ms)
+        if generation != self.generation:
+            # 设置已经变化，丢弃过期帧
+            self.frames_dropped += 1
+            if not self.timer.isActive():
+                self._start_render()
+            return
+        self.displayed_generation = generation
+        self.display(result, error)
@@ -125,6 +125,9 @@ def create_template_data_from_app(app_instance):
         "shadow_enabled": app_instance.shadow_check.isChecked() if hasattr(app_instance, 'shadow_check') else False,
         "stroke_enabled": app_instance.stroke_check.isChecked() if hasattr(app_instance, 'stroke_check') else False,
         "grid_position": app_instance.grid_combo.currentIndex() if hasattr(app_instance, 'grid_combo') else 4,
+        "tiled": app_instance.tile_check.isChecked() if hasattr(app_instance, 'tile_check') else False,
+        "tile_spacing": app_instance.tile_spacing_spin.value() if hasattr(app_instance, 'tile_spacing_spin') else 100,
+        "tile_stagger": app_instance.tile_stagger_spin.value() if hasattr(app_instance, 'tile_stagger_spin') else 50,
         "image_path": app_instance.watermark_image_path if hasattr(app_instance, 'watermark_image_path') else "",
         "image_opacity": app_instance.image_opacity_slider.value() if hasattr(app_instance, 'image_opacity_slider') else 80,
         "image_scale": app_instance.image_scale_slider.value() if hasattr(app_instance, 'image_scale_slider') else 100
@@ -240,6 +243,14 @@ def apply_template_to_app(template_data, app_instance):
         # 手动触发网格位置变化信号
         app_instance.grid_combo.currentIndexChanged.emit(template_data["grid_position"])
     
+    # 平铺水印参数（旧模板没有这些字段时使用默认值）
+    if hasattr(app_instance, 'tile_check'):
+        app_instance.tile_check.setChecked(template_data.get("tiled", False))
+    if hasattr(app_instance, 'tile_spacing_spin'):
+        app_instance.tile_spacing_spin.setValue(template_data.get("tile_spacing", 100))
+    if hasattr(app_instance, 'tile_stagger_spin'):
+        app_instance.tile_stagger_spin.setValue(template_data.get("tile_stagger", 50))
+    
     # 设置图片水印参数
     if hasattr(app_instance, 'image_opacity_slider'):
         app_instance.image_opacity_slider.setValue(template_data["image_opacity"])
@@ -257,8 +268,8 @@ def apply_template_to_app(template_data, app_instance):
         if hasattr(app_instance, 'image_path_label'):
             app_instance.image_path_label.setText(os.path.basename(template_data["image_path"]))
         try:
-            from PIL import Image
-            app_instance.watermark_image = Image.open(template_data["image_path"]).convert('RGBA')
+            from watermark_renderer import load_watermark_image
+            app_instance.watermark_image = load_watermark_image(template_data["image_path"])
         except:
             app_instance.watermark_image = None
     
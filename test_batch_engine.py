@@ -0,0 +1,35 @@
+import os
+from PIL import Image
+from batch_engine import process_image
+from export_manifest import ExportManifest, settings_hash
+
+def test_jpeg_export_without_watermark_layer(tmp_path):
+    """图片水印未选择图片时，RGB 的 JPEG 源仍能原样导出"""
+    source = tmp_path / 'source.jpg'
+    Image.new('RGB', (64, 48), (200, 30, 30)).save(source, 'JPEG')
+    output_folder = tmp_path / 'out'
+    os.makedirs(output_folder)
+    settings = {"watermark_type": 'image', "image_path": '', "image_opacity": 100, "image_scale": 100,
+                "position": [0, 0], "grid_position": 0, "rotation": 0}
+
+    result = process_image(str(source), settings, {"output_folder": str(output_folder), "format": 'JPEG'})
+
+    assert result["ok"], result["error"]
+    with Image.open(result["output"]) as img:
+        assert img.size == (64, 48)
+
+def test_manifest_records_source_read_before_processing(tmp_path):
+    """处理期间被覆盖的源图片不会被记录为已是最新"""
+    source = tmp_path / 'source.jpg'
+    Image.new('RGB', (64, 48), (200, 30, 30)).save(source, 'JPEG')
+    output_folder = tmp_path / 'out'
+    os.makedirs(output_folder)
+    export_options = {"output_folder": str(output_folder), "format": 'PNG'}
+    manifest = ExportManifest(str(output_folder), settings_hash(None, export_options))
+
+    result = process_image(str(source), None, export_options, signature=True)
+    Image.new('RGB', (80, 60), (30, 200, 30)).save(source, 'JPEG')
+    manifest.record(result)
+
+    assert result["ok"], result["error"]
+    assert not manifest.is_up_to_date(str(source), result["output"])
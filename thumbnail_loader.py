@@ -0,0 +1,151 @@
+import hashlib
+import io
+import os
+import threading
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage
+from PIL import Image
+
+THUMBNAIL_SIZE = 100  # 缩略图最大边长（导入窗口图标大小，主窗口图标由Qt缩放）
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'photo_watermark', 'thumbnails')
+FINGERPRINT_CHUNK = 64 * 1024  # 计算内容指纹时读取的文件头尾字节数
+
+def file_fingerprint(path):
+    """计算文件内容指纹（文件大小 + 首尾各64KB），用作缓存键"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_CHUNK))
+        if size > FINGERPRINT_CHUNK:
+            f.seek(max(FINGERPRINT_CHUNK, size - FINGERPRINT_CHUNK))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def _exif_thumbnail(img):
+    """读取 JPEG 中 EXIF 内嵌的缩略图，没有时返回 None"""
+    exif_data = img.info.get('exif')
+    if not exif_data:
+        return None
+    try:
+        # IFD1（ExifTags.IFD.IFD1 == -1）中的 JPEGInterchangeFormat(0x0201)
+        # 和 JPEGInterchangeFormatLength(0x0202) 记录了缩略图的位置
+        ifd1 = img.getexif().get_ifd(-1)
+        offset = ifd1.get(0x0201)
+        length = ifd1.get(0x0202)
+        if not offset or not length:
+            return None
+        # exif 数据以 "Exif\0\0" 开头，偏移量相对于其后的 TIFF 头
+        data = exif_data[6 + offset:6 + offset + length]
+        thumb = Image.open(io.BytesIO(data))
+        thumb.load()
+        return thumb
+    except Exception:
+        return None
+
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    """生成缩略图：优先使用 EXIF 内嵌缩略图，JPEG 使用 draft 模式低分辨率解码"""
+    with Image.open(path) as img:
+        if img.format == 'JPEG':
+            thumb = _exif_thumbnail(img)
+            if thumb is not None and max(thumb.size) >= size:
+                thumb.thumbnail((size, size), Image.LANCZOS)
+                return thumb.convert('RGBA')
+            # 让解码器直接按 1/2、1/4、1/8 缩小解码
+            img.draft('RGB', (size * 2, size * 2))
+        img.thumbnail((size, size), Image.LANCZOS)
+        return img.convert('RGBA')
+
+class ThumbnailCache:
+    """按文件内容指纹索引的磁盘缩略图缓存（不依赖Qt）"""
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, size=THUMBNAIL_SIZE):
+        self.cache_dir = cache_dir
+        self.size = size
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}_{self.size}.png")
+
+    def get(self, path):
+        """获取缩略图，磁盘缓存未命中时生成并写入缓存"""
+        cache_path = self._cache_path(file_fingerprint(path))
+        if os.path.exists(cache_path):
+            try:
+                with Image.open(cache_path) as cached:
+                    return cached.convert('RGBA')
+            except Exception:
+                pass  # 缓存文件损坏时重新生成
+
+        thumb = make_thumbnail(path, self.size)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # 先写临时文件再替换，避免并发写入产生不完整的缓存文件
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            thumb.save(tmp_path, 'PNG')
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # 缓存目录不可写时只返回缩略图
+        return thumb
+
+def pil_to_qimage(img):
+    """将 RGBA 模式的 PIL 图片转换为独立持有数据的 QImage"""
+    data = img.tobytes()
+    qimg = QImage(data, img.width, img.height, img.width * 4, QImage.Format_RGBA8888)
+    return qimg.copy()
+
+def pil_to_shared_qimage(img):
+    """将 RGBA 模式的 PIL 图片包装为 QImage，像素数据只复制一次（tobytes）
+
+    QImage 直接引用该缓冲区，缓冲区保存在 QImage 对象上，生命周期与之相同。
+    只能在持有该 Python 对象期间使用：跨线程传递时使用 object 类型的信号，
+    需要长期保存时先 copy() 或转换为 QPixmap。
+    """
+    data = img.tobytes()
+    qimg = QImage(data, img.width, img.height, img.width * 4, QImage.Format_RGBA8888)
+    qimg.pixel_buffer = data
+    return qimg
+
+class _ThumbnailSignals(QObject):
+    finished = pyqtSignal(str, QImage)
+
+class _ThumbnailTask(QRunnable):
+    def __init__(self, path, cache, signals):
+        super().__init__()
+        self.path = path
+        self.cache = cache
+        self.signals = signals
+
+    def run(self):
+        try:
+            qimg = pil_to_qimage(self.cache.get(self.path))
+        except Exception:
+            qimg = QImage()  # 无法解码的图片返回空图
+        self.signals.finished.emit(self.path, qimg)
+
+class ThumbnailLoader(QObject):
+    """在线程池中异步生成缩略图，完成后通过 thumbnail_ready 信号通知界面线程"""
+    thumbnail_ready = pyqtSignal(str, QImage)
+
+    def __init__(self, cache=None, parent=None):
+        super().__init__(parent)
+        self.cache = cache or ThumbnailCache()
+        self.pool = QThreadPool(self)
+        self._pending = set()
+        self._signals = _ThumbnailSignals()
+        self._signals.finished.connect(self._on_finished)
+
+    def request(self, path):
+        """请求生成缩略图（同一路径未完成时不重复提交）"""
+        if path in self._pending:
+            return
+        self._pending.add(path)
+        self.pool.start(_ThumbnailTask(path, self.cache, self._signals))
+
+    def cancel_pending(self):
+        """取消尚未开始的任务"""
+        self.pool.clear()
+        self._pending.clear()
+
+    def _on_finished(self, path, qimg):
+        if path not in self._pending:
+            return  # 已取消的请求
+        self._pending.discard(path)
+        self.thumbnail_ready.emit(path, qimg)
@@ -0,0 +1,114 @@
+import shutil
+from PIL import Image, TiffImagePlugin as tiff
+from watermark_renderer import (
+    composite_layer, render_pattern_region, render_watermark_layer, tile_params, watermark_position
+)
+
+BAND_BYTES = 4 * 1024 * 1024  # 每次读写的最大字节数（决定峰值内存）
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+# (光度解释, 每像素采样数) -> PIL模式，只支持 8 位、像素交错存储的未压缩数据
+# 灰度图片不分块处理：分块写回会保持源模式，彩色水印会变灰，与常规导出（RGBA）不一致
+TILED_MODES = {
+    (2, 3): 'RGB',
+    (2, 4): 'RGBA',
+}
+
+def _as_tuple(value):
+    return value if isinstance(value, tuple) else (value,)
+
+def read_tiff_layout(path):
+    """读取未压缩 TIFF 第一页的像素布局，不支持分块处理时返回 None
+
+    只解析文件头和 IFD，不解码像素（不受 Pillow 解压炸弹尺寸限制）。
+    返回 {"size", "mode", "blocks"}，blocks 为条带或图块列表：
+    (x, y, 宽, 高, 数据偏移, 每行字节数)，图块的宽高包含边缘填充。
+    """
+    with open(path, 'rb') as f:
+        header = f.read(16)
+        if header[:4] not in tiff.PREFIXES:
+            return None
+        ifd = tiff.ImageFileDirectory_v2(header if header[2] == 43 else header[:8])
+        f.seek(ifd.next)
+        ifd.load(f)
+
+    width, height = ifd.get(tiff.IMAGEWIDTH), ifd.get(tiff.IMAGELENGTH)
+    samples = ifd.get(tiff.SAMPLESPERPIXEL, 1)
+    mode = TILED_MODES.get((ifd.get(tiff.PHOTOMETRIC_INTERPRETATION), samples))
+    bits = _as_tuple(ifd.get(tiff.BITSPERSAMPLE, 1))
+    if (not width or not height or mode is None or ifd.get(tiff.COMPRESSION, 1) != 1
+            or ifd.get(tiff.PLANAR_CONFIGURATION, 1) != 1 or set(bits) != {8}):
+        return None
+    if mode == 'RGBA' and _as_tuple(ifd.get(tiff.EXTRASAMPLES)) != (2,):
+        return None  # 预乘或未指定含义的 alpha 通道
+
+    blocks = []
+    if tiff.TILEOFFSETS in ifd:
+        tile_w, tile_h = ifd[tiff.TILEWIDTH], ifd[tiff.TILELENGTH]
+        offsets, counts = _as_tuple(ifd[tiff.TILEOFFSETS]), _as_tuple(ifd.get(tiff.TILEBYTECOUNTS, ()))
+        across = -(-width // tile_w)
+        for i, offset in enumerate(offsets):
+            blocks.append(((i % across) * tile_w, (i // across) * tile_h, tile_w, tile_h, offset, tile_w * samples))
+    else:
+        rows_per_strip = min(ifd.get(tiff.ROWSPERSTRIP, height), height)
+        offsets, counts = _as_tuple(ifd[tiff.STRIPOFFSETS]), _as_tuple(ifd.get(tiff.STRIPBYTECOUNTS, ()))
+        for i, offset in enumerate(offsets):
+            top = i * rows_per_strip
+            blocks.append((0, top, width, min(rows_per_strip, height - top), offset, width * samples))
+    if len(counts) != len(blocks) or any(count < h * row_bytes
+                                         for (_, _, _, h, _, row_bytes), count in zip(blocks, counts)):
+        return None  # 数据不完整
+    return {"size": (width, height), "mode": mode, "blocks": blocks}
+
+def apply_watermark_tiled(src_path, output_path, settings, watermark_image=None, placement='position', layout=None):
+    """以流式分块方式为未压缩 TIFF 添加水印，返回改写的条带/图块数
+
+    先原样复制源文件，再只读写与水印区域相交的条带或图块中的相关行，
+    其余数据直接沿用源文件，峰值内存由 BAND_BYTES 和水印图层大小决定，与图片尺寸无关。
+    平铺模式下所有块都会改写，图案按段生成。settings 为 None 时只复制文件。
+    """
+    layout = layout or read_tiff_layout(src_path)
+    if layout is None:
+        raise ValueError(f'不支持分块处理的 TIFF: {src_path}')
+    shutil.copyfile(src_path, output_path)
+    layer = render_watermark_layer(settings, watermark_image) if settings is not None else None
+    if layer is None:
+        return 0
+
+    width, height = layout["size"]
+    mode = layout["mode"]
+    tiled = settings.get("tiled")
+    if tiled:
+        # 平铺模式覆盖整幅图片，每段只生成该段范围内的图案，不生成整幅图案图层
+        spacing, stagger = tile_params(settings)
+        box = (0, 0, width, height)
+    else:
+        x, y = watermark_position(settings, layout["size"], layer, 1.0, placement)
+        box = (max(0, x), max(0, y), min(width, x + layer.width), min(height, y + layer.height))
+    touched = 0
+    with open(output_path, 'r+b') as f:
+        for block_x, block_y, block_w, block_h, offset, row_bytes in layout["blocks"]:
+            # 只处理块内与水印相交的部分（图块的边缘填充不参与合成）
+            left, right = max(box[0], block_x), min(box[2], block_x + block_w, width)
+            top, bottom = max(box[1], block_y), min(box[3], block_y + block_h)
+            if right <= left or bottom <= top:
+                continue  # 与水印不相交的块原样保留
+            touched += 1
+            # 较高的条带按行分段读写，每段不超过 BAND_BYTES
+            band_rows = max(1, BAND_BYTES // row_bytes)
+            for band_top in range(top, bottom, band_rows):
+                rows = min(band_rows, bottom - band_top)
+                position = offset + (band_top - block_y) * row_bytes
+                f.seek(position)
+                band = Image.frombytes(mode, (block_w, rows), f.read(rows * row_bytes))
+                crop_box = (left - block_x, 0, right - block_x, rows)
+                part = band.crop(crop_box).convert('RGBA')
+                if tiled:
+                    pattern = render_pattern_region(layer, (left, band_top, right, band_top + rows), spacing, stagger)
+                    composite_layer(part, pattern, (0, 0), inplace=True)
+                else:
+                    composite_layer(part, layer, (x - left, y - band_top), inplace=True)
+                band.paste(part if mode == 'RGBA' else part.convert(mode), crop_box[:2])
+                f.seek(position)
+                f.write(band.tobytes())
+    return touched
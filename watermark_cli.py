@@ -0,0 +1,149 @@
+import argparse
+import glob
+import json
+import os
+import sys
+from batch_engine import BatchEngine, ExportProgress, DEFAULT_PROFILE, ENCODER_PROFILES, OUTPUT_FORMATS
+from export_manifest import ExportManifest, settings_hash
+from folder_scanner import DEFAULT_SCAN_WORKERS, scan_images
+from folder_watcher import DEFAULT_MAX_QUEUE, DEFAULT_POLL_INTERVAL, FolderWatcher
+from template_manager import TemplateManager
+
+DEFAULT_TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+def collect_images(inputs):
+    """展开输入的文件、文件夹和通配符，返回去重后的图片路径列表"""
+    paths = []
+    for pattern in inputs:
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        paths.extend(os.path.abspath(path) for path in sorted(matches))
+    return scan_images(paths, DEFAULT_SCAN_WORKERS)
+
+def jpeg_quality(value):
+    """解析 --quality：0-100 的整数或 keep"""
+    if value.lower() == 'keep':
+        return 'keep'
+    return int(value)
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='使用已保存的模板批量添加水印（无需图形界面）',
+        epilog='监视模式示例: python watermark_cli.py incoming -t cat -o watermarked --watch')
+    parser.add_argument('inputs', nargs='+', help='输入图片、文件夹或通配符（如 "photos/**/*.jpg"）')
+    parser.add_argument('-t', '--template', required=True, help='模板名称')
+    parser.add_argument('-o', '--output', required=True, help='输出文件夹')
+    parser.add_argument('--templates-dir', default=DEFAULT_TEMPLATES_DIR, help='模板目录')
+    parser.add_argument('--prefix', default='', help='输出文件名前缀')
+    parser.add_argument('--suffix', default='', help='输出文件名后缀')
+    parser.add_argument('--format', default='JPEG', choices=OUTPUT_FORMATS, type=str.upper,
+                        help='输出格式（未压缩的 TIFF 按原尺寸导出为 TIFF 时分块处理，适合超大图片）')
+    parser.add_argument('--quality', type=jpeg_quality, default=90,
+                        help='JPEG/WebP/AVIF 质量 (0-100)，keep 表示沿用源 JPEG 的量化表和色度抽样')
+    parser.add_argument('--profile', default=DEFAULT_PROFILE, choices=list(ENCODER_PROFILES),
+                        help='编码档位：fast 编码最快，balanced 兼顾速度和体积，smallest 体积最小')
+    parser.add_argument('--width', type=int, default=0, help='输出宽度（0 表示保持原尺寸）')
+    parser.add_argument('--height', type=int, default=0, help='输出高度（0 表示保持原尺寸）')
+    parser.add_argument('--percent', type=int, default=100, help='百分比缩放')
+    parser.add_argument('--placement', default='grid', choices=['grid', 'position'],
+                        help='水印位置：grid 使用模板的九宫格位置，position 使用模板保存的坐标')
+    parser.add_argument('--force', action='store_true', help='重新处理全部图片（默认跳过清单中已是最新的图片）')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='并行进程数（默认使用全部CPU核心）')
+    parser.add_argument('--summary', default=None, help='将JSON格式的汇总写入文件（默认输出到标准输出）')
+    parser.add_argument('-q', '--quiet', action='store_true', help='不输出逐张进度')
+    parser.add_argument('--watch', action='store_true',
+                        help='持续监视输入文件夹，只处理新增或修改过的图片（按 Ctrl+C 停止）')
+    parser.add_argument('--interval', type=float, default=DEFAULT_POLL_INTERVAL, help='监视模式的轮询间隔（秒）')
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE,
+                        help='监视模式每轮最多处理的图片数，超出的留到下一轮')
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.quality != 'keep' and not 0 <= args.quality <= 100:
+        parser.error('质量必须在 0-100 之间')
+    if args.percent < 1:
+        parser.error('百分比缩放必须大于 0')
+
+    template_manager = TemplateManager(args.templates_dir)
+    settings = template_manager.load_template(args.template)
+    if settings is None:
+        parser.error(f'模板 "{args.template}" 不存在')
+    if settings["watermark_type"] == 'image' and not os.path.isfile(settings.get("image_path", "")):
+        parser.error(f'模板 "{args.template}" 的水印图片不存在: {settings.get("image_path", "")}')
+
+    output_folder = os.path.abspath(args.output)
+    if args.watch:
+        if len(args.inputs) != 1 or not os.path.isdir(args.inputs[0]):
+            parser.error('监视模式需要指定一个输入文件夹')
+        if os.path.abspath(args.inputs[0]) == output_folder:
+            parser.error('禁止导出到原文件夹！请选择其他输出文件夹。')
+        image_list = []
+    else:
+        image_list = collect_images(args.inputs)
+        if not image_list:
+            parser.error('没有找到支持的图片')
+        # 检查是否导出到原文件夹
+        if any(os.path.dirname(f) == output_folder for f in image_list):
+            parser.error('禁止导出到原文件夹！请选择其他输出文件夹。')
+    os.makedirs(output_folder, exist_ok=True)
+
+    export_options = {
+        "output_folder": output_folder,
+        "prefix": args.prefix,
+        "suffix": args.suffix,
+        "format": args.format,
+        "quality": args.quality,
+        "profile": args.profile,
+        "width": args.width,
+        "height": args.height,
+        "percent": args.percent
+    }
+    # 输出文件夹中的任务清单使重复运行只处理新增、变化或失败的图片
+    manifest = ExportManifest(output_folder, settings_hash(settings, export_options, args.placement))
+    engine = BatchEngine(settings, export_options, args.jobs, placement=args.placement,
+                         manifest=manifest, resume=not args.force)
+
+    progress = ExportProgress(len(image_list))
+
+    def report_result(result):
+        progress.add(result)
+        if not args.quiet:
+            if result["skipped"]:
+                status = '跳过（未变化）'
+            else:
+                status = 'OK' if result["ok"] else f'失败: {result["error"]}'
+            print(f'[{progress.done}/{progress.total or "-"}] {result["source"]} {status}', file=sys.stderr)
+
+    if args.watch:
+        watcher = FolderWatcher(args.inputs[0], engine, args.interval, args.max_queue, on_result=report_result)
+        if not args.quiet:
+            print(f'正在监视 {watcher.input_folder}，按 Ctrl+C 停止', file=sys.stderr)
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass  # 正在处理的图片已由清单记录，下次启动时继续
+        progress.total = progress.done
+    else:
+        for result in engine.iter_results(image_list):
+            report_result(result)
+
+    summary = {
+        "template": args.template,
+        "output_folder": output_folder,
+        "jobs": engine.jobs
+    }
+    summary.update(progress.report())
+    if manifest.save_error:
+        print(manifest.save_error, file=sys.stderr)
+    summary_json = json.dumps(summary, indent=2, ensure_ascii=False)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            f.write(summary_json)
+    else:
+        print(summary_json)
+    return 0 if not progress.failures else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,436 @@
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from font_registry import font_registry
+
+# 每个进程内缓存已加载的水印图片，避免批量处理时重复解码
+_watermark_image_cache = {}
+
+# 已渲染水印图层的缓存预算（水印参数不变时每张图片只需合成）
+LAYER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+class LayerCache:
+    """已渲染水印图层的LRU缓存，按水印参数组成的可哈希键索引
+
+    缓存的图层是共享的，只能作为合成的源图层读取。
+    """
+    def __init__(self, max_bytes=LAYER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, source=None):
+        """查找图层；source 不为 None 时要求缓存条目引用同一个源图片对象"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is source:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, layer, source=None):
+        """放入图层并淘汰超出预算的条目（同时持有源图片引用，保证 id 不被复用）"""
+        size = layer.width * layer.height * 4
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[0].width * old[0].height * 4
+            self._entries[key] = (layer, source)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.width * evicted.height * 4
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+layer_cache = LayerCache()
+
+def load_font(font_name, font_size, bold=False, italic=False):
+    """加载字体：通过字体注册表解析字体文件和字形，并复用已加载的字体对象"""
+    return font_registry.get_font(font_name, font_size, bold, italic)
+
+# 水印图片金字塔的最小层尺寸和缓存的金字塔数量
+LOGO_PYRAMID_MIN_SIZE = 32
+LOGO_PYRAMID_CACHE_SIZE = 4
+_logo_pyramids = OrderedDict()
+_logo_pyramid_lock = threading.Lock()
+
+class LogoPyramid:
+    """水印图片的多级（每级缩小一半）预乘 alpha 金字塔
+
+    任意缩放比例都从不小于目标尺寸的最近一级重采样，避免每次都处理原图。
+    """
+    def __init__(self, image):
+        level = image.convert('RGBa')
+        self.levels = [level]
+        while min(level.size) // 2 >= LOGO_PYRAMID_MIN_SIZE:
+            # 预乘后的盒式平均不会在透明边缘产生色边
+            level = level.reduce(2)
+            self.levels.append(level)
+
+    @property
+    def size(self):
+        return self.levels[0].size
+
+    def resize(self, size):
+        """返回指定尺寸的预乘 alpha（RGBa）图片"""
+        source = self.levels[0]
+        for level in self.levels[1:]:
+            if level.width < size[0] or level.height < size[1]:
+                break
+            source = level
+        if source.size == size:
+            return source.copy()
+        return source.resize(size, Image.LANCZOS)
+
+def get_logo_pyramid(watermark_image):
+    """获取水印图片的金字塔（按图片对象缓存，水印图片变化时重新生成）"""
+    with _logo_pyramid_lock:
+        entry = _logo_pyramids.get(id(watermark_image))
+        if entry is not None and entry[0] is watermark_image:
+            _logo_pyramids.move_to_end(id(watermark_image))
+            return entry[1]
+        # 同时持有图片引用，保证 id 不被复用
+        pyramid = LogoPyramid(watermark_image)
+        _logo_pyramids[id(watermark_image)] = (watermark_image, pyramid)
+        while len(_logo_pyramids) > LOGO_PYRAMID_CACHE_SIZE:
+            _logo_pyramids.popitem(last=False)
+        return pyramid
+
+def load_watermark_image(image_path):
+    """加载水印图片（按路径和修改时间缓存）"""
+    key = (image_path, os.path.getmtime(image_path))
+    img = _watermark_image_cache.get(key)
+    if img is None:
+        img = Image.open(image_path).convert('RGBA')
+        _watermark_image_cache.clear()
+        _watermark_image_cache[key] = img
+    return img
+
+SHADOW_OFFSET = 2
+STROKE_WIDTH = 2
+ITALIC_SHEAR = 0.2  # 模拟斜体的水平倾斜量（约11度）
+TILE_SPACING = 100  # 平铺水印单元之间的默认间距（原图像素）
+TILE_STAGGER = 50  # 平铺水印隔行错开的默认比例（单元间隔的百分比）
+
+def render_text_effects(size, text, position, font, color, shadow=False, stroke=False, italic=False):
+    """绘制文本及其效果（阴影、描边和斜体），返回水印图层
+
+    文字只光栅化一次得到字形蒙版：阴影是偏移后的同一蒙版，描边使用 FreeType
+    原生描边，斜体对蒙版做一次错切变换。
+    """
+    w, h = size
+    # 字体本身已是斜体字形时不再倾斜
+    style = font.getname()[1].lower() if hasattr(font, 'getname') else ''
+    dx = 0
+    if italic and 'italic' not in style and 'oblique' not in style:
+        dx = int(round(ITALIC_SHEAR * h))  # 以底边为基准向右错切，图层宽度相应增加
+
+    def glyph_mask(stroke_width=0):
+        mask = Image.new('L', (w, h), 0)
+        ImageDraw.Draw(mask).text(position, text, font=font, fill=255,
+                                  stroke_width=stroke_width, stroke_fill=255)
+        if dx:
+            mask = mask.transform((w + dx, h), Image.AFFINE, (1, ITALIC_SHEAR, -dx, 0, 1, 0), Image.BILINEAR)
+        return mask
+
+    img = Image.new('RGBA', (w + dx, h), (255, 255, 255, 0))
+    w = img.width
+    mask = glyph_mask()
+
+    if shadow and w > SHADOW_OFFSET and h > SHADOW_OFFSET:
+        # 添加阴影效果（黑色阴影）
+        shadow_mask = mask.crop((0, 0, w - SHADOW_OFFSET, h - SHADOW_OFFSET))
+        img.paste((0, 0, 0, color[3]), (SHADOW_OFFSET, SHADOW_OFFSET, w, h), shadow_mask)
+
+    if stroke:
+        # 添加描边效果（黑色描边）
+        if isinstance(font, ImageFont.FreeTypeFont):
+            stroke_mask = glyph_mask(STROKE_WIDTH)
+        else:
+            # 位图字体不支持原生描边，对字形蒙版做一次膨胀
+            stroke_mask = mask.filter(ImageFilter.MaxFilter(2 * STROKE_WIDTH + 1))
+        img.paste((0, 0, 0, color[3]), (0, 0), stroke_mask)
+
+    # 绘制主文本
+    img.paste(tuple(color), (0, 0), mask)
+    return img
+
+def render_text_layer(settings, ratio=1.0):
+    """根据水印设置渲染文本水印图层，ratio 为目标图相对原图的缩放比例
+
+    返回的图层可能来自缓存，调用方不能修改。
+    """
+    text = settings["text_content"].strip()
+    if not text:
+        text = "watermark"
+
+    # 使用用户设置的字体、颜色和透明度
+    opacity = settings["opacity"] / 100.0  # 透明度百分比转小数
+    r, g, b = settings["text_color"][:3]
+    color = (r, g, b, int(255 * opacity))
+    scale_factor = settings["scale"] / 100.0  # 缩放因子
+
+    # 应用缩放后的字号
+    scaled_font_size = max(10, int(settings["font_size"] * scale_factor))
+    if ratio != 1.0:
+        # 降采样目标（如预览代理图）上的字号按比例缩小
+        scaled_font_size = max(1, int(round(scaled_font_size * ratio)))
+
+    # 相同参数渲染出的图层完全相同，直接复用
+    key = ('text', text, settings["font_name"], scaled_font_size, bool(settings["bold"]),
+           bool(settings["italic"]), color, settings["rotation"], scale_factor,
+           bool(settings["shadow_enabled"]), bool(settings["stroke_enabled"]))
+    txt_img = layer_cache.get(key)
+    if txt_img is not None:
+        return txt_img
+
+    font = load_font(settings["font_name"], scaled_font_size, settings["bold"], settings["italic"])
+
+    # 计算文本尺寸
+    temp_img = Image.new('RGBA', (1, 1), (255, 255, 255, 0))
+    temp_draw = ImageDraw.Draw(temp_img)
+    bbox = temp_draw.textbbox((0, 0), text, font=font)
+    w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+    # 创建水印图层并绘制文本（图层包含文本的完整尺寸，考虑基线偏移）
+    txt_img = render_text_effects((w, h), text, (-bbox[0], -bbox[1]), font, color,
+                                  settings["shadow_enabled"], settings["stroke_enabled"], settings["italic"])
+    w, h = txt_img.size
+
+    # 应用旋转（围绕水印自身中心）
+    angle = settings["rotation"]
+    if angle != 0:
+        txt_img = txt_img.rotate(angle, expand=1, center=(w//2, h//2))
+        w, h = txt_img.size
+
+    # 应用额外的图像缩放来获得更大的水印
+    if scale_factor > 1.0:
+        additional_scale = min(3.0, scale_factor)  # 最大额外缩放3倍
+        new_width = int(w * additional_scale)
+        new_height = int(h * additional_scale)
+        txt_img = txt_img.resize((new_width, new_height), Image.LANCZOS)
+
+    layer_cache.put(key, txt_img)
+    return txt_img
+
+@lru_cache(maxsize=16)
+def _opacity_lut(opacity):
+    """alpha 通道的透明度查找表（opacity 为百分比）"""
+    return [int(p * opacity / 100.0) for p in range(256)]
+
+def render_image_layer(watermark_image, settings, ratio=1.0):
+    """根据水印设置渲染图片水印图层（返回的图层可能来自缓存，调用方不能修改）
+
+    缩放、透明度和旋转后的结果按 (水印图片, 透明度, 缩放, 旋转) 缓存。
+    """
+    image_scale = settings["image_scale"] / 100.0 * ratio
+    key = ('image', id(watermark_image), settings["image_opacity"], image_scale, settings["rotation"])
+    cached = layer_cache.get(key, watermark_image)
+    if cached is not None:
+        return cached
+
+    # 从金字塔中最接近的一级缩放（降采样目标上按比例缩小），在预乘 alpha 空间中处理
+    pyramid = get_logo_pyramid(watermark_image)
+    new_width = max(1, int(pyramid.size[0] * image_scale))
+    new_height = max(1, int(pyramid.size[1] * image_scale))
+    watermark_img = pyramid.resize((new_width, new_height))
+
+    # 应用图片透明度（查表同时缩放预乘后的颜色和 alpha 通道）
+    image_opacity = settings["image_opacity"]
+    if image_opacity < 100:
+        watermark_img = watermark_img.point(_opacity_lut(image_opacity) * 4)
+
+    # 应用旋转
+    angle = settings["rotation"]
+    if angle != 0:
+        w, h = watermark_img.size
+        watermark_img = watermark_img.rotate(angle, expand=1, center=(w//2, h//2))
+
+    watermark_img = watermark_img.convert('RGBA')
+    layer_cache.put(key, watermark_img, watermark_image)
+    return watermark_img
+
+def render_watermark_layer(settings, watermark_image=None, ratio=1.0):
+    """渲染水印图层，图片水印缺少水印图片时返回 None"""
+    if settings["watermark_type"] == 'text':
+        return render_text_layer(settings, ratio)
+    if watermark_image is None and settings.get("image_path"):
+        watermark_image = load_watermark_image(settings["image_path"])
+    if watermark_image is None:
+        return None
+    return render_image_layer(watermark_image, settings, ratio)
+
+def tile_params(settings, ratio=1.0):
+    """返回平铺水印的 (间距, 错开比例)，间距按 ratio 缩放（旧模板没有这些字段时使用默认值）"""
+    spacing = max(0, int(round(settings.get("tile_spacing", TILE_SPACING) * ratio)))
+    stagger = min(100, max(0, settings.get("tile_stagger", TILE_STAGGER)))
+    return spacing, stagger
+
+def render_pattern_region(cell, box, spacing=TILE_SPACING, stagger=TILE_STAGGER):
+    """渲染平铺图案在 box=(左, 上, 右, 下)（图片坐标）范围内的部分
+
+    单元从图片左上角开始按 (单元尺寸 + 间距) 重复，奇数行向右错开间隔的 stagger%。
+    单元互不重叠，直接贴入即可，不需要逐个合成。
+    """
+    left, top, right, bottom = box
+    region = Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+    pitch_x, pitch_y = cell.width + spacing, cell.height + spacing
+    shift = pitch_x * stagger // 100
+    for row in range(top // pitch_y, (bottom - 1) // pitch_y + 1):
+        offset = shift if row % 2 else 0
+        for col in range((left - offset) // pitch_x, (right - 1 - offset) // pitch_x + 1):
+            region.paste(cell, (col * pitch_x + offset - left, row * pitch_y - top))
+    return region
+
+def render_pattern_layer(settings, size, watermark_image=None, ratio=1.0):
+    """渲染覆盖整幅图片（size 为目标图尺寸）的平铺水印图层，没有水印时返回 None
+
+    单元只渲染一次（来自图层缓存），图案按 (单元, 尺寸, 间距, 错开比例) 缓存，
+    同一尺寸的图片批量导出时只生成一次。返回的图层可能来自缓存，调用方不能修改。
+    """
+    cell = render_watermark_layer(settings, watermark_image, ratio)
+    if cell is None:
+        return None
+    spacing, stagger = tile_params(settings, ratio)
+    key = ('pattern', id(cell), tuple(size), spacing, stagger)
+    cached = layer_cache.get(key, cell)
+    if cached is not None:
+        return cached
+    pattern = render_pattern_region(cell, (0, 0) + tuple(size), spacing, stagger)
+    layer_cache.put(key, pattern, cell)
+    return pattern
+
+def get_grid_position(img_size, wm_size, grid_index):
+    """获取九宫格位置"""
+    w, h = img_size
+    ww, wh = wm_size
+    pos_map = {
+        0: (0, 0),  # 左上
+        1: ((w - ww)//2, 0),  # 上中
+        2: (w - ww, 0),  # 右上
+        3: (0, (h - wh)//2),  # 左中
+        4: ((w - ww)//2, (h - wh)//2),  # 中心
+        5: (w - ww, (h - wh)//2),  # 右中
+        6: (0, h - wh),  # 左下
+        7: ((w - ww)//2, h - wh),  # 下中
+        8: (w - ww, h - wh),  # 右下
+    }
+    return pos_map.get(grid_index, (0, 0))
+
+def clamp_position(position, img_size, wm_size):
+    """将指定位置限制在图片范围内"""
+    w, h = img_size
+    ww, wh = wm_size
+    x = max(0, min(position[0], w - ww))
+    y = max(0, min(position[1], h - wh))
+    return (x, y)
+
+def composite_layer(img, layer, pos, inplace=False):
+    """将水印图层合成到图片（RGBA 或 RGB 模式）的指定位置
+
+    只混合水印所在的矩形区域，不再分配整幅画布。inplace 为 False 时
+    返回新图片（用于缓存中的只读图片），为 True 时直接修改 img。
+    """
+    x, y = pos
+    # 计算水印与图片的相交区域，裁掉超出图片范围的部分
+    left, top = max(0, x), max(0, y)
+    right, bottom = min(img.width, x + layer.width), min(img.height, y + layer.height)
+    out = img if inplace else img.copy()
+    if right <= left or bottom <= top:
+        return out
+    region = layer
+    if (left - x, top - y, right - x, bottom - y) != (0, 0, layer.width, layer.height):
+        region = layer.crop((left - x, top - y, right - x, bottom - y))
+
+    # 与原先"先贴到透明画布再整体合成"的结果保持一致：图层以自身为蒙版贴到透明底上
+    patch = Image.new('RGBA', region.size, (255, 255, 255, 0))
+    patch.paste(region, (0, 0), region)
+    if out.mode == 'RGB':
+        # 不透明的 RGB 图片直接以 alpha 为蒙版混合，结果与合成到不透明 RGBA 上相同
+        out.paste(patch, (left, top), patch)
+    else:
+        out.alpha_composite(patch, (left, top))
+    return out
+
+def watermark_position(settings, full_size, layer, ratio=1.0, placement='position'):
+    """在原图坐标系中计算水印位置（layer 为按 ratio 缩放后的图层）"""
+    # 缩放后的水印尺寸换算回原图尺寸
+    full_wm_size = layer.size
+    if ratio != 1.0:
+        full_wm_size = (int(round(layer.width / ratio)), int(round(layer.height / ratio)))
+    if placement == 'grid':
+        return get_grid_position(full_size, full_wm_size, settings["grid_position"])
+    return clamp_position(settings["position"], full_size, full_wm_size)
+
+def render_preview_frame(preview, full_size, settings, watermark_image=None, dragging=False):
+    """在降采样的预览图上合成水印，位置在原图坐标系中计算，保证与导出结果一致
+
+    返回 (合成后的预览图, 原图坐标系中的水印位置)，没有水印或平铺模式时位置为 None。
+    """
+    ratio = preview.width / full_size[0]
+    if settings.get("tiled"):
+        layer = render_pattern_layer(settings, preview.size, watermark_image, ratio)
+        return (preview if layer is None else composite_layer(preview, layer, (0, 0))), None
+    layer = render_watermark_layer(settings, watermark_image, ratio)
+    if layer is None:
+        return preview, None
+    full_pos = watermark_position(settings, full_size, layer, ratio, 'position' if dragging else 'grid')
+    pos = (int(full_pos[0] * ratio), int(full_pos[1] * ratio))
+    return composite_layer(preview, layer, pos), full_pos
+
+def fit_preview(img, max_size):
+    """将预览帧缩小到不超过 max_size（已足够小时原样返回）
+
+    使用最近邻采样（与 Qt 默认的快速缩放相同），全分辨率预览也只需几毫秒。
+    """
+    max_w, max_h = max_size
+    if img.width <= max_w and img.height <= max_h:
+        return img
+    scale = min(max_w / img.width, max_h / img.height)
+    size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+    return img.resize(size, Image.NEAREST)
+
+def apply_watermark(img, settings, watermark_image=None, placement='position', inplace=False, full_size=None):
+    """为 RGBA 或 RGB 图片添加水印
+
+    placement 为 'position' 时使用设置中的拖拽位置，为 'grid' 时使用九宫格位置；
+    设置中 tiled 为 True 时水印平铺覆盖整幅图片（忽略位置）。
+    inplace 为 True 时直接在 img 上合成（img 不能是共享的缓存图片）。
+    full_size 为原图尺寸：img 是按比例缩小（或放大）后的图片时，水印参数随之缩放，
+    结果与在原图上添加水印后再缩放一致。
+    """
+    ratio = img.width / full_size[0] if full_size else 1.0
+    if settings.get("tiled"):
+        # 平铺模式：整幅图案图层只合成一次
+        layer = render_pattern_layer(settings, img.size, watermark_image, ratio)
+        return img if layer is None else composite_layer(img, layer, (0, 0), inplace)
+    layer = render_watermark_layer(settings, watermark_image, ratio)
+    if layer is None:
+        return img
+    full_pos = watermark_position(settings, full_size or img.size, layer, ratio, placement)
+    pos = (int(full_pos[0] * ratio), int(full_pos[1] * ratio))
+    return composite_layer(img, layer, pos, inplace)